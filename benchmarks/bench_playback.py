@@ -0,0 +1,303 @@
+"""
+Reproducible benchmarks for the playback scheduler and key actuation.
+
+Runs synthetic songs through the real PlaybackEngine with a stub `keyboard`
+module (no input privileges needed) and reports, per case:
+  - onset error percentiles (actual press time vs. scheduled time)
+  - chord spread (first to last press of one chord)
+  - max concurrent threads seen while pressing keys
+  - CPU time per second of song played
+  - load + preprocess time per 10k notes
+  - presses a game polling the keyboard at 60 fps would register, per
+    second of song (optionally with --key-gap/--max-rate rate limits)
+
+Results are written as JSON so runs can be compared:
+
+    python benchmarks/bench_playback.py --output before.json
+    python benchmarks/bench_playback.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+
+# --- Stub keyboard module (installed before the player is imported) ---
+class StubKeyboard(types.ModuleType):
+    """Records press/release times and the live thread count instead of sending keys."""
+    def __init__(self):
+        super().__init__("keyboard")
+        self.presses = []
+        self.releases = []
+        self.max_threads = 0
+
+    def press(self, key_char):
+        self.presses.append((time.perf_counter_ns(), key_char))
+        self.max_threads = max(self.max_threads, threading.active_count())
+
+    def release(self, key_char):
+        self.releases.append((time.perf_counter_ns(), key_char))
+
+    def is_modifier(self, key_char):
+        return False
+
+stub_keyboard = StubKeyboard()
+sys.modules["keyboard"] = stub_keyboard
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import piano_player # noqa: E402
+
+# --- Synthetic songs ---
+def sparse_song(rng, seconds):
+    """Single notes 400-900 ms apart."""
+    notes, t = [], 0
+    while t < seconds * 1000:
+        notes.append({"time": t, "key": f"1Key{rng.randrange(15)}"})
+        t += rng.randrange(400, 900)
+    return notes
+
+def dense_chord_song(rng, seconds):
+    """4-6 note chords every 120 ms."""
+    notes = []
+    for t in range(0, seconds * 1000, 120):
+        for key_index in rng.sample(range(15), rng.randrange(4, 7)):
+            notes.append({"time": t, "key": f"1Key{key_index}"})
+    return notes
+
+def rapid_trill_song(rng, seconds):
+    """Two keys alternating every 30 ms, plus repeated notes that force re-presses."""
+    notes = []
+    low, high = rng.sample(range(15), 2)
+    for step, t in enumerate(range(0, seconds * 1000, 30)):
+        notes.append({"time": t, "key": f"1Key{low if step % 2 else high}"})
+        if step % 8 == 0:
+            notes.append({"time": t + 15, "key": f"1Key{high}"})
+    return notes
+
+def long_song(rng, seconds):
+    """Medley-length song mixing single notes and chords, ~8 events/s."""
+    notes, t = [], 0
+    while t < seconds * 1000:
+        for key_index in rng.sample(range(15), rng.choice((1, 1, 1, 2, 3))):
+            notes.append({"time": t, "key": f"1Key{key_index}"})
+        t += rng.randrange(60, 190)
+    return notes
+
+CASES = {
+    # name: (generator, song seconds)
+    "sparse": (sparse_song, 300),
+    "dense_chords": (dense_chord_song, 300),
+    "rapid_trill": (rapid_trill_song, 300),
+    "very_long": (long_song, 3600),
+}
+
+# --- Measurements ---
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+GAME_FRAME_NS = 1_000_000_000 // 60
+
+def registered_presses(presses, releases, frame_ns=GAME_FRAME_NS):
+    """
+    Presses a game that samples the keyboard once per frame would see: a key
+    counts as pressed when a frame finds it down after the previous frame
+    found it up. Taps and gaps shorter than a frame can be missed.
+    """
+    edges = {}
+    for press_ns, key_char in presses:
+        edges.setdefault(key_char, []).append((press_ns, 1))
+    for release_ns, key_char in releases:
+        edges.setdefault(key_char, []).append((release_ns, 0))
+    count = 0
+    for key_edges in edges.values():
+        key_edges.sort()
+        was_down = False
+        frame = key_edges[0][0] // frame_ns * frame_ns
+        down = False
+        index = 0
+        while index < len(key_edges):
+            frame += frame_ns
+            while index < len(key_edges) and key_edges[index][0] <= frame:
+                down = key_edges[index][1] == 1
+                index += 1
+            count += down and not was_down
+            was_down = down
+    return count
+
+def bench_load(notes, workdir, repeats):
+    """Load + preprocess + compile time of a UTF-16 export, normalised per 10k notes."""
+    path = os.path.join(workdir, "song.txt")
+    with open(path, "w", encoding="utf-16") as file:
+        json.dump([{"name": "bench", "songNotes": notes}], file)
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        song = piano_player.load_song(path, piano_player.DEFAULT_KEY_MAPPING)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "notes": len(notes),
+        "events": len(song),
+        "load_s": best,
+        "load_ms_per_10k_notes": best * 1000 * 10000 / max(len(notes), 1),
+    }
+
+def bench_playback(notes, play_seconds, speed, hold, rate_limits=None):
+    """Plays the first play_seconds of a song in real time and measures onset accuracy."""
+    limit_ms = play_seconds * 1000 * speed
+    timestamp_dict, _ = piano_player.preprocess_data(note for note in notes if int(note["time"]) <= limit_ms)
+    song = piano_player.compile_song(timestamp_dict, piano_player.DEFAULT_KEY_MAPPING)
+
+    engine = piano_player.PlaybackEngine(piano_player.KeyboardBackend(), piano_player.PrecisionTimer())
+    engine.enable_telemetry()
+    engine.rate_limits = rate_limits
+    engine.set_song(song)
+    stub_keyboard.presses = []
+    stub_keyboard.releases = []
+    stub_keyboard.max_threads = 0
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    engine.run(speed, hold)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    engine.shutdown()
+
+    # Scheduled press times in order (every press of the plan), matched against actual presses
+    plan = engine.actuation_plan(song)
+    scheduled = sorted(
+        engine.start_ns + round(plan.times[g] * 1e6 / speed)
+        for g in range(len(plan))
+        for i in range(plan.offsets[g], plan.offsets[g + 1])
+        if plan.downs[i]
+    )
+    written = sum(len(chord) for chord in song.chords())
+    actual = sorted(press_ns for press_ns, _ in stub_keyboard.presses)
+    errors_ms = sorted((a - s) / 1e6 for a, s in zip(actual, scheduled))
+    song_seconds = song.max_timestamp / 1000 / speed
+    spreads_ms = sorted(engine.recorder.chord_spreads_ms())
+    return {
+        "played_song_s": song_seconds,
+        "wall_s": wall,
+        "presses": len(actual),
+        "scheduled_presses": len(scheduled),
+        "onset_error_ms": {
+            "p50": percentile(errors_ms, 0.50),
+            "p95": percentile(errors_ms, 0.95),
+            "p99": percentile(errors_ms, 0.99),
+            "max": errors_ms[-1] if errors_ms else 0.0,
+            "mean": statistics.fmean(errors_ms) if errors_ms else 0.0,
+        },
+        "chord_spread_ms": {
+            "chords": len(spreads_ms),
+            "p50": percentile(spreads_ms, 0.50),
+            "p99": percentile(spreads_ms, 0.99),
+            "max": spreads_ms[-1] if spreads_ms else 0.0,
+        },
+        "max_threads": stub_keyboard.max_threads,
+        "game": {
+            "written_per_s": written / song_seconds if song_seconds else 0.0,
+            "registered_per_s": registered_presses(stub_keyboard.presses, stub_keyboard.releases) / song_seconds if song_seconds else 0.0,
+            "dropped_by_governor": len(plan.report["dropped"]) if plan.report else 0,
+        },
+        "cpu_s_per_song_s": cpu / song_seconds if song_seconds else 0.0,
+    }
+
+def run_suite(args):
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "speed": args.speed,
+            "hold": args.hold,
+            "play_seconds": args.play_seconds,
+            "key_gap": args.key_gap,
+            "max_rate": args.max_rate,
+            "nudge": args.nudge,
+        },
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.cases:
+            generator, seconds = CASES[name]
+            notes = generator(random.Random(args.seed), seconds)
+            print(f"[{name}] {len(notes)} notes, {seconds}s", file=sys.stderr)
+            case = {"load": bench_load(notes, workdir, args.load_repeats)}
+            if args.play_seconds > 0:
+                rate_limits = {"key_gap_ms": args.key_gap, "max_rate": args.max_rate, "nudge_ms": args.nudge} if args.key_gap or args.max_rate else None
+                case["playback"] = bench_playback(notes, args.play_seconds, args.speed, args.hold, rate_limits)
+            results["cases"][name] = case
+    return results
+
+# --- Reporting ---
+METRICS = (
+    ("load", "load_ms_per_10k_notes", "load ms/10k notes"),
+    ("playback", "onset_error_ms.p50", "onset p50 ms"),
+    ("playback", "onset_error_ms.p95", "onset p95 ms"),
+    ("playback", "onset_error_ms.p99", "onset p99 ms"),
+    ("playback", "onset_error_ms.max", "onset max ms"),
+    ("playback", "chord_spread_ms.p99", "chord spread p99 ms"),
+    ("playback", "chord_spread_ms.max", "chord spread max ms"),
+    ("playback", "max_threads", "max threads"),
+    ("playback", "cpu_s_per_song_s", "CPU s/song s"),
+    ("playback", "game.written_per_s", "written notes/s"),
+    ("playback", "game.registered_per_s", "registered/s"),
+)
+
+def lookup(case, section, path):
+    value = case.get(section, {})
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def print_report(results, baseline=None):
+    for name, case in results["cases"].items():
+        print(f"{name}:")
+        for section, path, label in METRICS:
+            value = lookup(case, section, path)
+            if value is None:
+                continue
+            line = f"  {label:<20} {value:10.3f}"
+            old = lookup(baseline["cases"].get(name, {}), section, path) if baseline else None
+            if old is not None:
+                line += f"   (was {old:.3f}, {value - old:+.3f})"
+            print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Auto Piano Player scheduler and loader.")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="cases to run (default all)")
+    parser.add_argument("--play-seconds", type=float, default=10.0, help="real-time seconds played per case; 0 skips playback (default 10)")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed multiplier (default 1.0)")
+    parser.add_argument("--hold", type=float, default=0.1, help="hold duration in seconds (default 0.1)")
+    parser.add_argument("--key-gap", type=int, default=0, help="rate governor: min ms between presses of one key (default off)")
+    parser.add_argument("--max-rate", type=int, default=0, help="rate governor: max presses per second (default off)")
+    parser.add_argument("--nudge", type=int, default=40, help="rate governor: max ms a note may be delayed (default 40)")
+    parser.add_argument("--load-repeats", type=int, default=3, help="best-of-N for load timing (default 3)")
+    parser.add_argument("--seed", type=int, default=1234, help="seed for the synthetic songs (default 1234)")
+    parser.add_argument("--output", default="bench_results.json", help="where to write JSON results (default bench_results.json)")
+    parser.add_argument("--compare", metavar="PATH", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_report(results, baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Start-up benchmarks: how long a fresh interpreter takes to get to something useful.
+
+Each case runs in a new `python` process and is timed from spawn to exit (best of N):
+  - bare interpreter (the floor every other case pays)
+  - `import piano_player` (the package itself; submodules load on first use)
+  - `import piano_player.parsing` + loading one song (what tools and tests need)
+  - `import piano_player.cli` (argument parsing for headless playback)
+  - GUI cold start to a ready window (skipped when no display is available)
+
+Results are written as JSON so runs can be compared:
+
+    python benchmarks/bench_startup.py --output before.json
+    python benchmarks/bench_startup.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+# The GUI case builds the window, draws it once and exits; status 3 means there is no display
+GUI_READY = """
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    raise SystemExit(3)
+from piano_player.gui import PianoPlayerApp
+PianoPlayerApp(root)
+root.update()
+root.destroy()
+"""
+
+def cases(song_path):
+    return {
+        # name: code run with `python -c`
+        "interpreter": "pass",
+        "import_package": "import piano_player",
+        "parse_song": f"from piano_player.parsing import DEFAULT_KEY_MAPPING, load_song; load_song({song_path!r}, DEFAULT_KEY_MAPPING)",
+        "import_cli": "import piano_player.cli",
+        "gui_ready": GUI_READY,
+    }
+
+def write_song(workdir):
+    path = os.path.join(workdir, "song.json")
+    notes = [{"time": i * 150, "key": f"1Key{i % 15}"} for i in range(200)]
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([{"name": "bench", "songNotes": notes}], file)
+    return path
+
+def time_case(code, repeats):
+    """Best wall time of `python -c code`, or None if the case can't run here."""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    env.pop("PYTHONDONTWRITEBYTECODE", None) # Measure warm .pyc start-up, as users get it
+    subprocess.run([sys.executable, "-c", code], env=env, capture_output=True) # Writes the bytecode cache
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            if result.returncode != 3:
+                print(result.stderr.strip(), file=sys.stderr)
+            return None
+        best = min(best, elapsed)
+    return best * 1000
+
+def import_modules(code):
+    """piano_player modules and heavy third-party modules a case ends up importing."""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    probe = code + "\nimport sys; print(' '.join(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    watched = ("piano_player", "tkinter", "keyboard", "numpy", "concurrent", "multiprocessing")
+    return [name for name in result.stdout.split() if name in watched or name.startswith("piano_player.")]
+
+def run_suite(args):
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+        },
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, code in cases(write_song(workdir)).items():
+            if name not in args.cases:
+                continue
+            elapsed_ms = time_case(code, args.repeats)
+            if elapsed_ms is None:
+                print(f"[{name}] skipped", file=sys.stderr)
+                continue
+            results["cases"][name] = {"wall_ms": elapsed_ms, "modules": import_modules(code)}
+    return results
+
+def print_report(results, baseline=None):
+    floor = results["cases"].get("interpreter", {}).get("wall_ms", 0.0)
+    for name, case in results["cases"].items():
+        line = f"{name:<16} {case['wall_ms']:8.1f} ms"
+        if name != "interpreter":
+            line += f"  (+{case['wall_ms'] - floor:.1f} over interpreter)"
+        old = baseline["cases"].get(name) if baseline else None
+        if old is not None:
+            line += f"   was {old['wall_ms']:.1f}, {case['wall_ms'] - old['wall_ms']:+.1f}"
+        print(line)
+        if case.get("modules"):
+            print(f"  loads: {', '.join(case['modules'])}")
+
+def main(argv=None):
+    names = list(cases(""))
+    parser = argparse.ArgumentParser(description="Benchmark Auto Piano Player start-up and import time.")
+    parser.add_argument("--cases", nargs="+", choices=names, default=names, help="cases to run (default all)")
+    parser.add_argument("--repeats", type=int, default=10, help="best-of-N per case (default 10)")
+    parser.add_argument("--output", default="bench_startup.json", help="where to write JSON results (default bench_startup.json)")
+    parser.add_argument("--compare", metavar="PATH", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_report(results, baseline)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
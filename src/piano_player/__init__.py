@@ -0,0 +1,52 @@
+"""
+Auto Piano Player for Sky: Children of the Light.
+
+The package is split so that each use only pays for what it needs:
+  parsing    song files -> CompiledSong (no GUI, no keyboard hooks)
+  midi       MIDI import (NumPy is imported on first use)
+  analysis   density, polyphony and safe-hold analysis of a loaded song (NumPy too)
+  render     offline WAV preview of a song's actuation plan (NumPy too)
+  cache      persistent compiled-song cache
+  timing, telemetry, actuation, backends, engine, process   playback
+  library    bulk check/convert of song folders
+  control    asyncio engine API and the local JSON control server (client: one-shot requests)
+  cli, gui   front ends (only gui imports tkinter)
+
+The public names of the submodules are also available from the package
+itself; each submodule is imported the first time one of its names is used.
+"""
+_EXPORTS = {
+    "parsing": ("DEFAULT_KEY_MAPPING", "MAX_NOTE_TIME_MS", "preprocess_data", "parse_key_index", "CompiledSong", "compile_song",
+                "normalize_song", "describe_normalize_stats", "MIDI_EXTENSIONS", "is_midi_file", "SongFormatError",
+                "sniff_encoding", "iter_song_notes", "list_songs", "iter_songs", "load_song"),
+    "midi": ("MIDI_SCALE_STEPS", "MIDI_FOLDS", "read_midi", "midi_key_events", "load_midi", "midi_song_notes"),
+    "analysis": ("analyze_song", "density_curve", "safe_hold_s", "describe_analysis"),
+    "render": ("key_frequency", "render_plan"),
+    "cache": ("DEFAULT_CACHE_MAX_BYTES", "default_cache_dir", "file_digest", "SongCache"),
+    "timing": ("DEFAULT_SPIN_THRESHOLD_MS", "MAX_SPIN_THRESHOLD_MS", "PrecisionTimer", "VirtualClock"),
+    "backends": ("KeyboardBackend", "NullBackend", "RecordingBackend", "BACKENDS"),
+    "telemetry": ("TimingRecorder",),
+    "actuation": ("REPRESS_GAP_NS", "ActuationPlan", "compile_plan", "KeyActuator"),
+    "engine": ("EventChannel", "PlaybackEngine", "build_playlist"),
+    "process": ("ProcessEngine", "share_song", "attach_shared_song", "raise_process_priority"),
+    "library": ("SONG_FILE_EXTENSIONS", "find_song_files", "validate_notes", "check_file"),
+    "control": ("AsyncEngine", "ControlServer"),
+    "client": ("DEFAULT_CONTROL_PORT", "send_command"),
+    "cli": ("main",),
+    "gui": ("PianoPlayerApp",),
+}
+_ORIGIN = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_ORIGIN)
+
+def __getattr__(name):
+    module = _ORIGIN.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value # Later lookups skip __getattr__
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
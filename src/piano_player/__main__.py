@@ -0,0 +1,11 @@
+import sys
+
+if not __package__: # Run as a script (python src/piano_player, or a frozen EXE): make the package importable
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support() # Lets the one-click EXE start the engine process
+    from piano_player.cli import main
+    sys.exit(main())
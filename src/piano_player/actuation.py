@@ -0,0 +1,265 @@
+"""Actuation plans and the key actuator that replays them."""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+
+# --- Key actuation ---
+REPRESS_GAP_NS = 5_000_000 # Minimum time a key stays up between a release and its next press
+PLAN_SNAPSHOT_EVERY = 64 # Plan groups between held-key snapshots
+DEFAULT_NUDGE_MS = 40 # How far the rate governor may delay a note before dropping it
+
+class ActuationPlan:
+    """
+    A song compiled together with its hold time into a flat, time-sorted list
+    of key operations. Group g happens at song time times[g] (ms) and applies
+    the ops offsets[g]:offsets[g + 1]: key index keys[i] goes down if downs[i]
+    else up; within a group releases come before presses. Every press has a
+    matching release and a key is never pressed while down, so replaying the
+    plan cannot leave a key stuck. snapshots[s] is the bitmask of keys held
+    just before group s * PLAN_SNAPSHOT_EVERY, for O(log n) seeks.
+    limits are the rate limits it was built with and report what the
+    governor changed (None when no limits were set), see govern_presses.
+    """
+    __slots__ = ("times", "offsets", "keys", "downs", "key_chars", "snapshots", "hold_ms", "gap_ms", "limits", "report")
+
+    def __init__(self, times, offsets, keys, downs, key_chars, snapshots, hold_ms, gap_ms, limits=(0, 0, 0), report=None):
+        self.times = times
+        self.offsets = offsets
+        self.keys = keys
+        self.downs = downs
+        self.key_chars = key_chars
+        self.snapshots = snapshots
+        self.hold_ms = hold_ms
+        self.gap_ms = gap_ms
+        self.limits = limits
+        self.report = report
+
+    def __len__(self):
+        return len(self.times)
+
+    def index_at(self, ms):
+        """Index of the first group at or after song time ms."""
+        return bisect_left(self.times, ms)
+
+    def held_at(self, index):
+        """Bitmask of the keys that are down just before group index."""
+        held = self.snapshots[index // PLAN_SNAPSHOT_EVERY]
+        keys = self.keys
+        downs = self.downs
+        for i in range(self.offsets[index // PLAN_SNAPSHOT_EVERY * PLAN_SNAPSHOT_EVERY], self.offsets[index]):
+            if downs[i]:
+                held |= 1 << keys[i]
+            else:
+                held &= ~(1 << keys[i])
+        return held
+
+def song_presses(song):
+    """(onset ms, key index) of every note, in time order, a key at most once per event."""
+    times = song.times
+    offsets = song.offsets
+    keys = song.keys
+    for index in range(len(times)):
+        for key_index in dict.fromkeys(keys[offsets[index]:offsets[index + 1]]):
+            yield times[index], key_index
+
+def govern_presses(song, key_gap_ms, press_interval_ms, tolerance_ms):
+    """
+    Fits the song's presses to the game's input limits (all song ms):
+    presses of one key at least key_gap_ms apart, and on average no more
+    than one press per press_interval_ms over all keys (a token bucket that
+    holds the song's largest chord, so chords still go down together).
+    A press that breaks a limit is delayed just enough to fit; one that
+    would have to move more than tolerance_ms is dropped.
+    Returns the placed (onset, key index) presses in time order and a
+    report: {"moved", "max_shift_ms", "dropped": [(written ms, key index)]}.
+    """
+    offsets = song.offsets
+    capacity = max((offsets[i + 1] - offsets[i] for i in range(len(song.times))), default=1)
+    tokens = capacity
+    token_ms = 0.0
+    last_press = {}
+    placed = []
+    report = {"moved": 0, "max_shift_ms": 0.0, "dropped": []}
+
+    # Popped in time order, so the bucket only ever moves forward; a press
+    # that has to wait is pushed back with its new onset
+    pending = [(onset, order, key_index, onset) for order, (onset, key_index) in enumerate(song_presses(song))]
+    while pending:
+        onset, order, key_index, written = heapq.heappop(pending)
+        earliest = onset
+        previous = last_press.get(key_index)
+        if previous is not None:
+            earliest = max(earliest, previous + key_gap_ms)
+        if press_interval_ms:
+            available = min(capacity, tokens + (earliest - token_ms) / press_interval_ms)
+            if available < 1 - 1e-9:
+                earliest += (1 - available) * press_interval_ms
+        if earliest > onset:
+            if earliest - written > tolerance_ms:
+                report["dropped"].append((written, key_index))
+            else:
+                heapq.heappush(pending, (earliest, order, key_index, written))
+            continue
+        if press_interval_ms:
+            tokens = min(capacity, tokens + (onset - token_ms) / press_interval_ms) - 1
+            token_ms = onset
+        if onset > written:
+            report["moved"] += 1
+            report["max_shift_ms"] = max(report["max_shift_ms"], onset - written)
+        last_press[key_index] = onset
+        placed.append((onset, key_index))
+    report["dropped"].sort()
+    return placed, report
+
+def compile_plan(song, hold_ms, gap_ms, key_gap_ms=0, press_interval_ms=0, tolerance_ms=0):
+    """
+    Builds the ActuationPlan of a CompiledSong with every note held for
+    hold_ms (song time). A key that is pressed again before its hold is over
+    is released gap_ms before the new press (or halfway between the two
+    presses if they are closer than that), so onsets never move.
+    With key_gap_ms or press_interval_ms set, presses are first fitted to
+    those limits by govern_presses, and a key that is pressed again stays
+    up for at least half of key_gap_ms, so the game sees both edges.
+    """
+    limits = (key_gap_ms, press_interval_ms, tolerance_ms)
+    report = None
+    if key_gap_ms or press_interval_ms:
+        presses, report = govern_presses(song, key_gap_ms, press_interval_ms, tolerance_ms)
+        report["shortened"] = 0
+    else:
+        presses = song_presses(song)
+    up_ms = max(gap_ms, key_gap_ms / 2) # How long a key is up before it is pressed again
+
+    ops = [] # (song ms, 0 = release / 1 = press, key index)
+    last_press = {} # key index -> onset of its press that has no release yet
+    for onset, key_index in presses:
+        previous = last_press.get(key_index)
+        if previous is not None:
+            release = previous + hold_ms
+            if release > onset - up_ms:
+                release = max(onset - up_ms, previous + (onset - previous) / 2)
+                if report is not None:
+                    report["shortened"] += 1
+            ops.append((release, 0, key_index))
+        last_press[key_index] = onset
+        ops.append((onset, 1, key_index))
+    for key_index, previous in last_press.items():
+        ops.append((previous + hold_ms, 0, key_index))
+    ops.sort()
+
+    plan_times = array("d")
+    plan_offsets = array("I", [0])
+    plan_keys = array("B")
+    downs = array("B")
+    snapshots = []
+    held = 0
+    for op_time, down, key_index in ops:
+        if not plan_times or op_time != plan_times[-1]:
+            if len(plan_times) % PLAN_SNAPSHOT_EVERY == 0:
+                snapshots.append(held)
+            plan_times.append(op_time)
+            plan_offsets.append(plan_offsets[-1])
+        plan_keys.append(key_index)
+        downs.append(down)
+        plan_offsets[-1] += 1
+        if down:
+            held |= 1 << key_index
+        else:
+            held &= ~(1 << key_index)
+    if len(plan_times) % PLAN_SNAPSHOT_EVERY == 0:
+        snapshots.append(held) # So held_at(len(plan)) works too
+    return ActuationPlan(plan_times, plan_offsets, plan_keys, downs, song.key_chars, snapshots, hold_ms, gap_ms, limits, report)
+
+def describe_plan_report(report, key_chars, speed=1.0):
+    """One-line summary of what the rate governor changed (times at the given speed)."""
+    parts = []
+    if report["moved"]:
+        parts.append(f"delayed {report['moved']} notes (up to {report['max_shift_ms'] / speed:.1f} ms)")
+    if report["shortened"]:
+        parts.append(f"shortened {report['shortened']} holds")
+    dropped = report["dropped"]
+    if dropped:
+        shown = ", ".join(f"{ms / speed / 1000:.2f}s {key_chars[key_index]}" for ms, key_index in dropped[:5])
+        parts.append(f"dropped {len(dropped)} notes ({shown}{', ...' if len(dropped) > 5 else ''})")
+    return "Rate limits: " + ("; ".join(parts) if parts else "no changes needed")
+
+class KeyActuator:
+    """
+    Replays ActuationPlan groups on a backend, on the scheduler's thread, and
+    tracks which keys are down (a bitmask of key indices) so a seek, pause
+    or stop can bring the keyboard to a known state.
+    """
+    def __init__(self, backend, clock):
+        self.backend = backend
+        self.clock = clock
+        self.held = 0
+        self.key_chars = ()
+        self.held_note = {} # key index -> telemetry note id of the press currently holding it
+        self.recorder = None # Optional TimingRecorder
+        self.lock = threading.Lock() # release_all can come from other threads
+
+    def apply(self, plan, index, scheduled_ns):
+        """Applies plan group index, scheduled at clock time scheduled_ns."""
+        recorder = self.recorder
+        key_chars = plan.key_chars
+        keys = plan.keys
+        downs = plan.downs
+        with self.lock:
+            dispatch_ns = self.clock.now_ns()
+            for i in range(plan.offsets[index], plan.offsets[index + 1]):
+                key_index = keys[i]
+                if downs[i]:
+                    note_id = -1
+                    if recorder is not None:
+                        note_id = recorder.begin(scheduled_ns, dispatch_ns, key_chars[key_index])
+                    self._press(key_index)
+                    if recorder is not None:
+                        recorder.mark_press(note_id, self.clock.now_ns()) # Once the backend has sent it
+                    self.held_note[key_index] = note_id
+                elif self.held >> key_index & 1:
+                    self._release(key_index)
+
+    def restore(self, plan, index, press=True):
+        """
+        Makes the held keys match the plan just before group index (after a
+        seek or resume). With press=False keys are only released, never pressed.
+        """
+        with self.lock:
+            if plan.key_chars != self.key_chars:
+                self._set_held(0) # Held keys belong to the previous mapping
+                self.key_chars = plan.key_chars
+            target = plan.held_at(index)
+            self._set_held(target if press else target & self.held)
+
+    def release_all(self):
+        with self.lock:
+            self._set_held(0)
+
+    def _set_held(self, target):
+        changed = self.held ^ target
+        key_index = 0
+        while changed >> key_index:
+            if changed >> key_index & 1:
+                if target >> key_index & 1:
+                    self._press(key_index)
+                else:
+                    self._release(key_index)
+            key_index += 1
+
+    def _press(self, key_index):
+        try:
+            self.backend.press(self.key_chars[key_index])
+        except Exception: # keyboard lib might complain if context changes
+            pass
+        self.held |= 1 << key_index
+
+    def _release(self, key_index):
+        try:
+            self.backend.release(self.key_chars[key_index])
+        except Exception:
+            pass
+        self.held &= ~(1 << key_index)
+        note_id = self.held_note.pop(key_index, -1)
+        if note_id >= 0 and self.recorder is not None:
+            self.recorder.mark_release(note_id, self.clock.now_ns())
@@ -0,0 +1,100 @@
+"""Load-time song analysis: repeat intervals, polyphony, density and a safe hold (needs NumPy)."""
+from .midi import _import_numpy
+
+# --- Song analysis ---
+MIN_AUTO_HOLD_S = 0.01 # Auto hold never goes below this, however fast a key repeats
+
+def _note_arrays(np, song):
+    """Onset (ms) and key index of every note, in event order."""
+    times = np.frombuffer(song.times, dtype=np.uint32).astype(np.int64)
+    counts = np.diff(np.frombuffer(song.offsets, dtype=np.uint32).astype(np.int64))
+    return np.repeat(times, counts), np.frombuffer(song.keys, dtype=np.uint8)
+
+def _next_press(np, onsets, keys):
+    """Per note, the time (ms) until its key is pressed again; inf for a key's last note (and repeats within one event)."""
+    order = np.lexsort((onsets, keys))
+    sorted_keys = keys[order]
+    intervals = np.diff(onsets[order]).astype(float)
+    intervals[(sorted_keys[1:] != sorted_keys[:-1]) | (intervals == 0)] = np.inf
+    following = np.full(len(onsets), np.inf)
+    following[order[:-1]] = intervals
+    return following
+
+def min_key_intervals(np, song):
+    """Per key index, the shortest time (song ms) between two presses of that key; inf if it never repeats."""
+    onsets, keys = _note_arrays(np, song)
+    shortest = np.full(max(len(song.key_chars), 1), np.inf)
+    np.minimum.at(shortest, keys, _next_press(np, onsets, keys))
+    return shortest
+
+def shortest_repeat_ms(song):
+    """Shortest time (song ms) between two presses of one key, over all keys; inf if no key repeats."""
+    np = _import_numpy("Song analysis")
+    return float(min_key_intervals(np, song).min())
+
+def safe_hold_s(song, speed=1.0, up_ms=5.0):
+    """
+    The longest hold (seconds, real time) at this speed that releases every
+    key at least up_ms before it is pressed again, or None if no key repeats.
+    """
+    shortest = song.shortest_repeat_ms()
+    if shortest == float("inf"):
+        return None
+    return max(MIN_AUTO_HOLD_S, (shortest / speed - up_ms) / 1000)
+
+def density_curve(song, bins):
+    """Notes per second of song time in each of bins equal slices of the song."""
+    np = _import_numpy("Song analysis")
+    onsets, _ = _note_arrays(np, song)
+    duration_ms = max(song.max_timestamp, 1)
+    counts, _ = np.histogram(onsets, bins=bins, range=(0, duration_ms + 1))
+    return (counts * (1000 * bins / (duration_ms + 1))).tolist()
+
+def analyze_song(song, speed=1.0, hold=0.25, up_ms=5.0):
+    """
+    Summary of a CompiledSong for choosing speed and hold:
+      min_interval_ms   per key character, shortest re-press interval (song ms; keys that never repeat are left out)
+      fastest_key       key character with the shortest re-press interval (None if no key repeats)
+      peak_chord        most keys pressed by one event
+      peak_polyphony    most keys down at once when every note is held hold seconds at speed
+      peak_density      most notes within one second of song time
+      mean_density      notes per second over the whole song
+      safe_hold_s       see safe_hold_s
+    """
+    np = _import_numpy("Song analysis")
+    onsets, keys = _note_arrays(np, song)
+    shortest = min_key_intervals(np, song)
+    # A note is held for hold, or until just before its key is pressed again; polyphony
+    # at each onset is the notes started by then minus the ones released by then
+    following = _next_press(np, onsets, keys)
+    releases = np.sort(onsets + np.minimum(hold * 1000 * speed, np.maximum(following - up_ms * speed, following / 2)))
+    polyphony = np.searchsorted(onsets, onsets, "right") - np.searchsorted(releases, onsets, "right")
+    per_second = np.searchsorted(onsets, onsets + 1000, "left") - np.arange(len(onsets))
+    repeating = np.flatnonzero(np.isfinite(shortest))
+    fastest = int(repeating[np.argmin(shortest[repeating])]) if len(repeating) else None
+    return {
+        "notes": len(onsets),
+        "duration_ms": song.max_timestamp,
+        "min_interval_ms": {song.key_chars[k]: int(shortest[k]) for k in repeating.tolist() if song.key_chars[k] is not None},
+        "fastest_key": song.key_chars[fastest] if fastest is not None else None,
+        "peak_chord": int(np.diff(np.frombuffer(song.offsets, dtype=np.uint32)).max()) if len(song) else 0,
+        "peak_polyphony": int(polyphony.max()) if len(onsets) else 0,
+        "peak_density": int(per_second.max()) if len(onsets) else 0,
+        "mean_density": len(onsets) * 1000 / song.max_timestamp if song.max_timestamp else 0.0,
+        "safe_hold_s": safe_hold_s(song, speed, up_ms),
+        "speed": speed,
+    }
+
+def describe_analysis(analysis, hold=None):
+    """One-line summary of analyze_song's result, with a hold suggestion if hold is too long."""
+    parts = [f"{analysis['mean_density']:.1f} notes/s (peak {analysis['peak_density']})",
+             f"chords up to {analysis['peak_chord']}, polyphony {analysis['peak_polyphony']}"]
+    fastest_key = analysis["fastest_key"]
+    if fastest_key is not None:
+        parts.append(f"fastest repeat {analysis['min_interval_ms'][fastest_key]} ms ({fastest_key})")
+    safe = analysis["safe_hold_s"]
+    if safe is not None:
+        parts.append(f"safe hold ≤ {safe:.3f}s at {analysis['speed']:g}x")
+        if hold is not None and hold > safe:
+            parts.append(f"hold {hold:g}s will be cut short on repeats")
+    return "; ".join(parts)
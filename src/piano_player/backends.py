@@ -0,0 +1,52 @@
+"""Output backends: where key presses and releases go."""
+import json
+
+# --- Output backends ---
+class KeyboardBackend:
+    """Sends key events to the focused window through the keyboard library (imported on first use)."""
+    def __init__(self):
+        self._keyboard = None
+
+    def _lib(self):
+        if self._keyboard is None:
+            import keyboard
+            self._keyboard = keyboard
+        return self._keyboard
+
+    def press(self, key_char):
+        self._lib().press(key_char)
+
+    def release(self, key_char):
+        self._lib().release(key_char)
+
+class NullBackend:
+    """Discards key events (dry runs, timing checks)."""
+    def press(self, key_char):
+        pass
+
+    def release(self, key_char):
+        pass
+
+class RecordingBackend:
+    """Records (time_ns, action, key) tuples stamped with the given clock."""
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+
+    def press(self, key_char):
+        self.events.append((self.clock.now_ns(), "press", key_char))
+
+    def release(self, key_char):
+        self.events.append((self.clock.now_ns(), "release", key_char))
+
+    def dump(self, file):
+        """Writes the recorded events as JSON lines, with times in ms relative to the first event."""
+        origin = self.events[0][0] if self.events else 0
+        for time_ns, action, key_char in self.events:
+            file.write(json.dumps({"t_ms": round((time_ns - origin) / 1e6, 3), "action": action, "key": key_char}) + "\n")
+
+BACKENDS = {
+    "keyboard": lambda clock: KeyboardBackend(),
+    "null": lambda clock: NullBackend(),
+    "record": RecordingBackend,
+}
@@ -0,0 +1,155 @@
+"""Persistent cache of compiled songs."""
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+
+from .parsing import CompiledSong, load_song
+
+# --- Compiled song cache ---
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def default_cache_dir():
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "auto-piano-player")
+
+def file_digest(filepath):
+    """Content hash of a song file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+class SongCache:
+    """
+    Persistent cache of compiled songs. Each entry is a flat binary file
+    (header + times + offsets + keys) that is mmap-ed on load, so the arrays
+    are used in place without decoding. Entries are keyed by path, song index
+    and key mapping, and validated against the source file's size, mtime and
+    content hash; stale entries fall back to the JSON path and get rewritten.
+    Total size is bounded with least-recently-used eviction.
+    """
+    MAGIC = b"APPC"
+    VERSION = 1
+    # magic, version, byte order, song index, file size, file mtime_ns, content hash,
+    # event count, note count, skipped notes, max timestamp
+    HEADER = struct.Struct("<4sHBxIQq16sIIII")
+    HEADER_SIZE = (HEADER.size + 7) // 8 * 8
+    BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def load(self, filepath, key_mapping, song_index=0):
+        """Returns the CompiledSong for filepath, from the cache when it is still valid."""
+        stat = os.stat(filepath)
+        entry_path = self._entry_path(filepath, key_mapping, song_index)
+        try:
+            song = self._read(entry_path, filepath, stat, key_mapping, song_index)
+        except (OSError, ValueError, struct.error):
+            song = None
+        if song is not None:
+            return song
+
+        digest = file_digest(filepath)
+        song = load_song(filepath, key_mapping, song_index)
+        if song:
+            try:
+                self._write(entry_path, stat, digest, song, song_index)
+                self._evict()
+            except OSError:
+                pass # Cache is best-effort; the song is already loaded
+        return song
+
+    def clear(self):
+        for name, _, _ in self._entries():
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def _entry_path(self, filepath, key_mapping, song_index):
+        identity = repr((os.path.abspath(filepath), song_index, sorted(key_mapping.items())))
+        name = hashlib.blake2b(identity.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, name + ".song")
+
+    def _read(self, entry_path, filepath, stat, key_mapping, song_index):
+        with open(entry_path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, byte_order, cached_index, size, mtime_ns, digest,
+         n_events, n_keys, skipped, _) = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION or byte_order != self.BYTE_ORDER or cached_index != song_index:
+            return None
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            # Touched or copied but possibly unchanged: fall back to the content hash
+            if file_digest(filepath) != digest:
+                return None
+            self._write_header(entry_path, stat, digest, n_events, n_keys, skipped, song_index)
+        expected = self.HEADER_SIZE + 4 * n_events + 4 * (n_events + 1) + n_keys
+        if len(data) != expected:
+            return None
+        os.utime(entry_path) # Mark as recently used
+
+        view = memoryview(data)
+        times_end = self.HEADER_SIZE + 4 * n_events
+        offsets_end = times_end + 4 * (n_events + 1)
+        times = view[self.HEADER_SIZE:times_end].cast("I")
+        offsets = view[times_end:offsets_end].cast("I")
+        keys = view[offsets_end:expected]
+        key_chars = tuple(key_mapping.get(i) for i in range(max(key_mapping, default=-1) + 1))
+        return CompiledSong(times, offsets, keys, key_chars, skipped)
+
+    def _pack_header(self, stat, digest, n_events, n_keys, skipped, song_index, max_timestamp):
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.BYTE_ORDER, song_index, stat.st_size,
+                                  stat.st_mtime_ns, digest, n_events, n_keys, skipped, max_timestamp)
+        return header.ljust(self.HEADER_SIZE, b"\0")
+
+    def _write_header(self, entry_path, stat, digest, n_events, n_keys, skipped, song_index):
+        with open(entry_path, "r+b") as file:
+            max_timestamp = self.HEADER.unpack(file.read(self.HEADER.size))[-1]
+            file.seek(0)
+            file.write(self._pack_header(stat, digest, n_events, n_keys, skipped, song_index, max_timestamp))
+
+    def _write(self, entry_path, stat, digest, song, song_index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(self._pack_header(stat, digest, len(song.times), len(song.keys),
+                                         song.skipped_notes, song_index, song.max_timestamp))
+            file.write(array("I", song.times).tobytes())
+            file.write(array("I", song.offsets).tobytes())
+            file.write(bytes(song.keys))
+        os.replace(tmp_path, entry_path)
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith(".song"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue # Probably still mapped by a loaded song (Windows)
+            total -= size
@@ -0,0 +1,406 @@
+"""Command line interface."""
+import os
+import sys
+import json
+import time
+import argparse
+
+from .parsing import DEFAULT_KEY_MAPPING, describe_normalize_stats
+from .midi import MIDI_FOLDS, MIDI_SCALE_STEPS
+from .cache import SongCache
+from .timing import PrecisionTimer, VirtualClock
+from .backends import BACKENDS, RecordingBackend
+from .actuation import DEFAULT_NUDGE_MS, describe_plan_report
+from .engine import PlaybackEngine, build_playlist
+from .process import ProcessEngine
+from .library import check_file, find_song_files
+from .client import DEFAULT_CONTROL_PORT, send_command
+
+# --- Command line ---
+def positive_float(text):
+    value = float(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError("must be positive")
+    return value
+
+def non_negative_int(text):
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("must not be negative")
+    return value
+
+def add_normalize_arguments(parser):
+    parser.add_argument("--merge-window", type=non_negative_int, default=0, metavar="MS", help="merge events starting within MS of a chord's first note into it")
+    parser.add_argument("--grid", type=non_negative_int, default=0, metavar="MS", help="snap onsets to a grid of MS milliseconds")
+    parser.add_argument("--dedupe", action="store_true", help="drop repeated keys within one event (implied by --merge-window/--grid)")
+
+def add_control_arguments(parser):
+    parser.add_argument("--socket", metavar="PATH", help="use a Unix socket at PATH instead of loopback TCP")
+    parser.add_argument("--port", type=non_negative_int, default=DEFAULT_CONTROL_PORT, help=f"loopback TCP port (default {DEFAULT_CONTROL_PORT})")
+
+def add_rate_arguments(parser):
+    parser.add_argument("--key-gap", type=non_negative_int, default=0, metavar="MS", help="keep presses of one key at least MS apart (real time), so the game registers each")
+    parser.add_argument("--max-rate", type=non_negative_int, default=0, metavar="N", help="send at most N presses per second over all keys")
+    parser.add_argument("--nudge", type=non_negative_int, default=DEFAULT_NUDGE_MS, metavar="MS", help=f"how far notes may be delayed to fit --key-gap/--max-rate before they are dropped (default {DEFAULT_NUDGE_MS})")
+
+def add_hold_arguments(parser):
+    parser.add_argument("--auto-hold", action="store_true", help="shorten the hold per song so no key is held into its next press (needs NumPy)")
+
+def numpy_missing(args):
+    """True (after printing why) when --auto-hold was asked for but NumPy is not installed."""
+    import importlib.util
+    if args.auto_hold and importlib.util.find_spec("numpy") is None:
+        print("Error: --auto-hold needs NumPy (pip install numpy).", file=sys.stderr)
+        return True
+    return False
+
+def rate_limits(args):
+    """The engine's rate_limits from the command line, or None when no limit was given."""
+    if args.key_gap or args.max_rate:
+        return {"key_gap_ms": args.key_gap, "max_rate": args.max_rate, "nudge_ms": args.nudge}
+    return None
+
+def midi_transpose(text):
+    return text if text == "auto" else int(text)
+
+def add_midi_arguments(parser):
+    parser.add_argument("--transpose", type=midi_transpose, default="auto", metavar="N|auto", help="MIDI: shift by N semitones, or pick the shift that fits most notes (default auto)")
+    parser.add_argument("--fold", choices=MIDI_FOLDS, default="octave", help="MIDI: what to do with notes outside C4..C6 (default octave)")
+    parser.add_argument("--accidentals", choices=sorted(MIDI_SCALE_STEPS), default="down", help="MIDI: move sharps/flats down or up to a natural, or drop them (default down)")
+    parser.add_argument("--drums", action="store_true", help="MIDI: include channel 10 percussion")
+
+def midi_options(args):
+    return {"transpose": args.transpose, "fold": args.fold, "accidentals": args.accidentals, "include_drums": args.drums}
+
+def normalize_options(args):
+    """normalize_song keyword arguments from the command line, or None when no normalisation was asked for."""
+    if args.merge_window or args.grid or args.dedupe:
+        return {"merge_window_ms": args.merge_window, "grid_ms": args.grid, "dedupe": True}
+    return None
+
+def cmd_play(args):
+    if numpy_missing(args):
+        return 2
+    song_cache = None if args.no_cache else SongCache()
+    if args.process:
+        if args.record or args.trace or args.virtual_clock or args.backend == "record":
+            print("Error: --process cannot be combined with --record, --trace or --virtual-clock.", file=sys.stderr)
+            return 2
+        backend = None # Lives in the engine process
+        engine = ProcessEngine(args.backend, song_cache=song_cache)
+    else:
+        clock = VirtualClock() if args.virtual_clock else PrecisionTimer()
+        backend_name = "record" if args.record else args.backend
+        backend = BACKENDS[backend_name](clock)
+        engine = PlaybackEngine(backend, clock, song_cache=song_cache)
+    if args.trace:
+        engine.enable_telemetry()
+    engine.normalize = normalize_options(args)
+    engine.midi_options = midi_options(args)
+    engine.rate_limits = rate_limits(args)
+    engine.auto_hold = args.auto_hold
+
+    try:
+        engine.playlist = build_playlist(args.files, args.song)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        engine.shutdown()
+        return 1
+
+    failures = []
+    def on_status(message):
+        failures.append(message)
+        print(message, file=sys.stderr)
+    def on_track_changed():
+        if not args.quiet:
+            print(f"Playing {engine.playlist[engine.playlist_position][2]}", file=sys.stderr)
+            if engine.song.normalize_stats:
+                print(f"  {describe_normalize_stats(engine.song.normalize_stats)}", file=sys.stderr)
+            if engine.rate_limits or engine.auto_hold:
+                plan = engine.actuation_plan(engine.song)
+                hold = plan.hold_ms / 1000 / engine.speed
+                if hold < engine.hold:
+                    print(f"  Hold shortened to {hold:.3f}s (a key repeats after {engine.song.shortest_repeat_ms():.0f} ms)", file=sys.stderr)
+                if plan.report:
+                    print(f"  {describe_plan_report(plan.report, plan.key_chars, engine.speed)}", file=sys.stderr)
+    engine.on_status = on_status
+    engine.on_track_changed = on_track_changed
+
+    if args.delay > 0 and not args.virtual_clock:
+        time.sleep(args.delay) # Time to focus the game window
+
+    started = time.perf_counter()
+    try:
+        engine.run(args.speed, args.hold)
+    except KeyboardInterrupt:
+        engine.stop()
+        engine.release_all()
+        return 130
+    finally:
+        engine.shutdown()
+    elapsed = time.perf_counter() - started
+
+    if args.trace:
+        with open(args.trace, "w", encoding="utf-8") as file:
+            engine.recorder.dump(file)
+        percentiles = engine.recorder.percentiles(window=engine.recorder.capacity)
+        if percentiles and not args.quiet:
+            print("Lateness ms: p50 {:.3f}  p95 {:.3f}  p99 {:.3f}".format(*percentiles), file=sys.stderr)
+
+    if isinstance(backend, RecordingBackend):
+        if args.record in (None, "-"):
+            backend.dump(sys.stdout)
+        else:
+            with open(args.record, "w", encoding="utf-8") as file:
+                backend.dump(file)
+        if not args.quiet:
+            presses = sum(1 for _, action, _ in backend.events if action == "press")
+            print(f"Recorded {presses} presses in {elapsed:.2f}s wall time.", file=sys.stderr)
+    return 1 if failures else 0
+
+def cmd_serve(args):
+    import asyncio
+    from .control import AsyncEngine, ControlServer
+
+    if numpy_missing(args):
+        return 2
+    song_cache = None if args.no_cache else SongCache()
+    if args.process:
+        engine = ProcessEngine(args.backend, song_cache=song_cache)
+    else:
+        clock = PrecisionTimer()
+        engine = PlaybackEngine(BACKENDS[args.backend](clock), clock, song_cache=song_cache)
+        engine.enable_telemetry() # Feeds the "telemetry" command and subscription
+    engine.normalize = normalize_options(args)
+    engine.midi_options = midi_options(args)
+    engine.rate_limits = rate_limits(args)
+    engine.auto_hold = args.auto_hold
+    engine.speed = args.speed
+    engine.hold = args.hold
+
+    async def serve():
+        async_engine = AsyncEngine(engine)
+        server = await ControlServer(async_engine, args.socket, port=args.port).start()
+        if not args.quiet:
+            print(f"Listening on {server.address}", file=sys.stderr)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+            await async_engine.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        return 130
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+def cmd_render(args):
+    from .render import render_plan
+
+    if numpy_missing(args):
+        return 2
+    clock = VirtualClock()
+    engine = PlaybackEngine(BACKENDS["null"](clock), clock, song_cache=None if args.no_cache else SongCache())
+    engine.normalize = normalize_options(args)
+    engine.midi_options = midi_options(args)
+    engine.rate_limits = rate_limits(args)
+    engine.auto_hold = args.auto_hold
+    engine.speed = args.speed
+    engine.hold = args.hold
+    output = args.output or os.path.splitext(args.file)[0] + ".wav"
+    try:
+        song = engine.load_file(args.file, args.song - 1)
+        if not song:
+            print(f"Error: no valid notes found in {args.file}.", file=sys.stderr)
+            return 1
+        plan = engine.actuation_plan(song)
+        started = time.perf_counter()
+        seconds = render_plan(plan, args.speed, output, args.sample_rate)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.shutdown()
+    if not args.quiet:
+        print(f"Rendered {seconds:.1f}s of audio to {output} in {time.perf_counter() - started:.2f}s.", file=sys.stderr)
+    return 0
+
+def control_value(text):
+    """A KEY=VALUE argument of the send command; the value is JSON if it parses, else a string."""
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+def cmd_send(args):
+    request = {"cmd": args.cmd, **dict(args.params)}
+    try:
+        reply = send_command(request, args.socket, port=args.port)
+    except OSError as e:
+        print(f"Error: cannot reach the control server: {e}", file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print(json.dumps(reply, ensure_ascii=False))
+    return 0 if reply.get("ok") else 1
+
+def describe_check_report(report):
+    """One line per file for the check command, and whether the file is usable."""
+    if report["error"]:
+        return f"FAIL  {report['path']}: {report['error']}", False
+    songs = report["songs"]
+    playable = sum(song["playable"] for song in songs)
+    problems = []
+    for field, label in (("unknown_keys", "unknown keys"), ("invalid_times", "invalid times"),
+                         ("malformed", "malformed notes"), ("duplicates", "duplicates")):
+        total = sum(song[field] for song in songs)
+        if total:
+            problems.append(f"{total} {label}")
+    empty = [song["title"] for song in songs if not song["playable"]]
+    if empty:
+        problems.append(f"empty: {', '.join(empty)}")
+    status = "OK  " if not problems else "WARN" if playable else "EMPTY"
+    line = f"{status:<5} {report['path']}: {len(songs)} song(s), {playable} notes"
+    if problems:
+        line += f" ({'; '.join(problems)})"
+    return line, bool(playable)
+
+def cmd_check(args):
+    normalize = normalize_options(args)
+    jobs = args.jobs or os.cpu_count() or 1
+    totals = {"files": 0, "failed": 0, "songs": 0, "notes": 0}
+
+    def emit(report):
+        line, usable = describe_check_report(report)
+        totals["files"] += 1
+        totals["failed"] += not usable
+        totals["songs"] += len(report["songs"])
+        totals["notes"] += sum(song["playable"] for song in report["songs"])
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False), flush=True)
+        elif not args.quiet or not line.startswith("OK"):
+            print(line, flush=True)
+
+    import concurrent.futures
+
+    paths = {} # future -> file, so a worker that raised still gets its FAIL line
+    def report_of(future):
+        filepath = paths.pop(future)
+        try:
+            return future.result()
+        except Exception as e:
+            return {"path": filepath, "songs": [], "error": f"{type(e).__name__}: {e}"}
+
+    # Files are submitted a few at a time and reported as they finish, so memory
+    # stays flat no matter how big the library is.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        for filepath, relative_path in find_song_files(args.paths):
+            output_path = os.path.join(args.convert, os.path.splitext(relative_path)[0] + ".json") if args.convert else None
+            future = pool.submit(check_file, filepath, DEFAULT_KEY_MAPPING, normalize, output_path, midi_options(args))
+            paths[future] = filepath
+            pending.add(future)
+            if len(pending) >= jobs * 4:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    emit(report_of(future))
+        for future in concurrent.futures.as_completed(pending):
+            emit(report_of(future))
+
+    print(f"{totals['files']} file(s), {totals['songs']} song(s), {totals['notes']} playable notes; "
+          f"{totals['failed']} file(s) unusable.", file=sys.stderr)
+    return 1 if totals["failed"] else 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv: # Straight to the GUI, skipping the parser
+        return run_gui()
+    parser = argparse.ArgumentParser(prog="piano_player", description="Auto Piano Player for Sky: Children of the Light. Run without arguments for the GUI.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    play_parser = subparsers.add_parser("play", help="play song files headless, as one playlist")
+    play_parser.add_argument("files", nargs="+", help="song files (.txt/.json/.mid)")
+    play_parser.add_argument("--speed", type=positive_float, default=1.0, help="speed multiplier (default 1.0)")
+    play_parser.add_argument("--hold", type=positive_float, default=0.25, help="key hold duration in seconds (default 0.25)")
+    play_parser.add_argument("--song", type=int, default=None, help="only play this song (1-based) of each file; default plays all")
+    play_parser.add_argument("--backend", choices=sorted(BACKENDS), default="keyboard", help="where key events go (default keyboard)")
+    play_parser.add_argument("--record", metavar="PATH", help="record key events as JSON lines to PATH ('-' for stdout); implies --backend record")
+    play_parser.add_argument("--virtual-clock", action="store_true", help="simulate time instead of waiting (use with null/record)")
+    play_parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before starting, to focus the game window")
+    play_parser.add_argument("--trace", metavar="PATH", help="record per-note timing and write it as CSV to PATH")
+    add_normalize_arguments(play_parser)
+    add_midi_arguments(play_parser)
+    add_rate_arguments(play_parser)
+    add_hold_arguments(play_parser)
+    play_parser.add_argument("--no-cache", action="store_true", help="do not use the compiled song cache")
+    play_parser.add_argument("--process", action="store_true", help="run the scheduler and key presses in a separate high-priority process")
+    play_parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    play_parser.set_defaults(func=cmd_play)
+
+    check_parser = subparsers.add_parser("check", help="validate song files and folders in parallel, optionally converting them")
+    check_parser.add_argument("paths", nargs="+", help="song files, or folders to search for .txt/.json/.mid files")
+    check_parser.add_argument("--jobs", type=int, default=0, help="worker processes (default: one per CPU)")
+    check_parser.add_argument("--convert", metavar="DIR", help="write each file's compiled songs to DIR as clean UTF-8 JSON, mirroring folder layout")
+    add_normalize_arguments(check_parser)
+    add_midi_arguments(check_parser)
+    check_parser.add_argument("--json", action="store_true", help="print one JSON report per file instead of a summary line")
+    check_parser.add_argument("-q", "--quiet", action="store_true", help="only print files with problems")
+    check_parser.set_defaults(func=cmd_check)
+
+    serve_parser = subparsers.add_parser("serve", help="play on command from a local JSON control socket")
+    add_control_arguments(serve_parser)
+    serve_parser.add_argument("--speed", type=positive_float, default=1.0, help="speed multiplier when play gives none (default 1.0)")
+    serve_parser.add_argument("--hold", type=positive_float, default=0.25, help="key hold duration when play gives none (default 0.25)")
+    serve_parser.add_argument("--backend", choices=sorted(set(BACKENDS) - {"record"}), default="keyboard", help="where key events go (default keyboard)")
+    add_normalize_arguments(serve_parser)
+    add_midi_arguments(serve_parser)
+    add_rate_arguments(serve_parser)
+    add_hold_arguments(serve_parser)
+    serve_parser.add_argument("--no-cache", action="store_true", help="do not use the compiled song cache")
+    serve_parser.add_argument("--process", action="store_true", help="run the scheduler and key presses in a separate high-priority process")
+    serve_parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    send_parser = subparsers.add_parser("send", help="send one command to a running 'serve' and print the reply")
+    send_parser.add_argument("cmd", help="load, play, pause, resume, seek, speed, stop, status or telemetry")
+    send_parser.add_argument("params", nargs="*", type=control_value, metavar="KEY=VALUE", help="request fields, e.g. ms=30000 or files='[\"a.json\"]'")
+    add_control_arguments(send_parser)
+    send_parser.add_argument("-q", "--quiet", action="store_true", help="do not print the reply")
+    send_parser.set_defaults(func=cmd_send)
+
+    render_parser = subparsers.add_parser("render", help="render a song, as it would be played, to a WAV file (needs NumPy)")
+    render_parser.add_argument("file", help="song file (.txt/.json/.mid)")
+    render_parser.add_argument("-o", "--output", metavar="PATH", help="WAV file to write (default: the song file's name with .wav)")
+    render_parser.add_argument("--song", type=int, default=1, help="which song of the file to render (1-based, default 1)")
+    render_parser.add_argument("--speed", type=positive_float, default=1.0, help="speed multiplier (default 1.0)")
+    render_parser.add_argument("--hold", type=positive_float, default=0.25, help="key hold duration in seconds (default 0.25)")
+    render_parser.add_argument("--sample-rate", type=int, choices=(22050, 44100, 48000), default=44100, help="samples per second (default 44100)")
+    add_normalize_arguments(render_parser)
+    add_midi_arguments(render_parser)
+    add_rate_arguments(render_parser)
+    add_hold_arguments(render_parser)
+    render_parser.add_argument("--no-cache", action="store_true", help="do not use the compiled song cache")
+    render_parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    render_parser.set_defaults(func=cmd_render)
+
+    gui_parser = subparsers.add_parser("gui", help="open the GUI (the default)")
+    gui_parser.add_argument("--process", action="store_true", help="run the scheduler and key presses in a separate high-priority process")
+
+    args = parser.parse_args(argv)
+    if args.command in (None, "gui"):
+        return run_gui(separate_process=getattr(args, "process", False))
+    return args.func(args)
+
+def run_gui(separate_process=False):
+    """Opens the GUI; tkinter (and the GUI module) are only imported here."""
+    try:
+        from .gui import run_gui
+    except ImportError as e:
+        print(f"The GUI is not available ({e}). Use 'play' for headless playback.", file=sys.stderr)
+        return 1
+    run_gui(separate_process)
+    return 0
@@ -0,0 +1,22 @@
+"""Blocking client for the control server; kept free of asyncio so one-shot scripts start fast."""
+import json
+import socket
+
+DEFAULT_CONTROL_PORT = 47615
+
+def send_command(request, path=None, host="127.0.0.1", port=DEFAULT_CONTROL_PORT, timeout=5.0):
+    """Sends one request to a running control server and returns its reply (blocking; for scripts)."""
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection((host, port), timeout)
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps({"id": 1, **request}).encode("utf-8") + b"\n")
+        stream.flush()
+        while line := stream.readline():
+            reply = json.loads(line)
+            if "event" not in reply:
+                return reply
+    raise ConnectionError("The control server closed the connection.")
@@ -0,0 +1,371 @@
+"""asyncio engine API and the local JSON control server."""
+import os
+import math
+import stat
+import json
+import asyncio
+
+from .engine import PlaybackEngine, build_playlist
+from .client import DEFAULT_CONTROL_PORT
+
+# --- Async engine ---
+CONTROL_QUEUE_SIZE = 256 # Messages waiting for one slow client before progress updates are dropped
+MIN_PROGRESS_INTERVAL_MS = 20
+MIN_TELEMETRY_INTERVAL_MS = 250
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+class AsyncEngine:
+    """
+    asyncio API over a PlaybackEngine (or ProcessEngine). Create it inside a
+    running event loop. Commands only signal the playback thread and return
+    at once; loading runs on the engine's loader thread. The engine's
+    callbacks reach the loop through call_soon_threadsafe, so the playback
+    thread never waits for the loop or its clients.
+    Events are dicts put on every queue returned by subscribe().
+    """
+    def __init__(self, engine=None):
+        self.engine = engine if engine is not None else PlaybackEngine()
+        self.loop = asyncio.get_running_loop()
+        self.state = "stopped" # "stopped", "playing" or "paused"
+        self._idle = asyncio.Event() # Set while the playback thread is not running
+        self._idle.set()
+        self._lock = asyncio.Lock() # Serialises load/play/stop/close from concurrent clients
+        self._subscribers = set()
+
+        self.engine.on_finished = self._threadsafe(self._finished)
+        self.engine.on_track_changed = self._threadsafe(self._track_changed)
+        self.engine.on_status = self._threadsafe(lambda message: self.publish({"event": "status", "message": message}))
+        self.engine.on_exit = self._threadsafe(self._exited)
+
+    def _threadsafe(self, handler):
+        return lambda *args: self.loop.call_soon_threadsafe(handler, *args)
+
+    # --- Events ---
+    def subscribe(self, maxsize=CONTROL_QUEUE_SIZE):
+        """A queue receiving every event from now on; pass it to unsubscribe() when done."""
+        events = asyncio.Queue(maxsize)
+        self._subscribers.add(events)
+        return events
+
+    def unsubscribe(self, events):
+        self._subscribers.discard(events)
+
+    def publish(self, event):
+        """Puts event on every subscriber queue, dropping a full queue's oldest message."""
+        for events in self._subscribers:
+            if events.full():
+                events.get_nowait()
+            events.put_nowait(event)
+
+    def _finished(self):
+        self.publish({"event": "finished"})
+
+    def _track_changed(self):
+        self.publish({"event": "track_changed", **self.track()})
+
+    def _exited(self):
+        self.state = "stopped"
+        self._idle.set()
+        self.publish({"event": "stopped", "ms": self.engine.current_song_time_ms})
+
+    # --- Commands ---
+    async def load(self, filepaths, song_number=None):
+        """Makes filepaths the playlist and loads its first song; returns track()."""
+        async with self._lock:
+            return await self._load(filepaths, song_number)
+
+    async def _load(self, filepaths, song_number):
+        await self._stop()
+        engine = self.engine
+        playlist = await self.loop.run_in_executor(engine.loader, build_playlist, filepaths, song_number)
+        if not playlist:
+            raise ValueError("No songs found.")
+        filepath, song_index, _ = playlist[0]
+        song = await self.loop.run_in_executor(engine.loader, engine.load_file, filepath, song_index)
+        if not song:
+            raise ValueError("No valid notes found in the file.")
+        engine.playlist = playlist
+        engine.playlist_position = 0
+        engine.set_song(song)
+        return self.track()
+
+    async def play(self, speed=None, hold=None, start_ms=None):
+        """Starts the current song (and the rest of the playlist) from start_ms, by default where it stopped."""
+        async with self._lock:
+            engine = self.engine
+            if engine.song is None:
+                raise ValueError("Nothing loaded.")
+            speed = engine.speed if speed is None else _positive("Speed", speed)
+            hold = engine.hold if hold is None else _positive("Hold", hold)
+            if start_ms is not None and (not isinstance(start_ms, int) or isinstance(start_ms, bool) or start_ms < 0):
+                raise ValueError("start_ms must be a whole number of milliseconds (0 or more).")
+            await self._stop()
+            if start_ms is None:
+                start_ms = engine.current_song_time_ms if engine.current_song_time_ms < engine.max_timestamp else 0
+            self._idle.clear()
+            self.state = "playing"
+            try:
+                engine.play(speed, hold, min(start_ms, engine.max_timestamp))
+            except BaseException:
+                self.state = "stopped"
+                self._idle.set()
+                raise
+
+    def pause(self):
+        if self.state == "playing":
+            self.engine.pause()
+            self.state = "paused"
+
+    def resume(self):
+        if self.state == "paused":
+            self.engine.resume()
+            self.state = "playing"
+
+    def seek(self, ms):
+        if self.engine.song is None:
+            raise ValueError("Nothing loaded.")
+        ms = max(0, min(int(ms), self.engine.max_timestamp))
+        if self.state == "stopped":
+            self.engine.current_song_time_ms = ms # Where the next play() starts from
+        else:
+            self.engine.seek(ms)
+
+    def set_speed(self, speed):
+        self.engine.set_speed(_positive("Speed", speed))
+
+    async def stop(self):
+        """Stops playback and waits until every key is released."""
+        async with self._lock:
+            await self._stop()
+
+    async def _stop(self):
+        if not self._idle.is_set():
+            self.engine.stop()
+            await self._idle.wait()
+
+    async def close(self):
+        async with self._lock:
+            await self._stop()
+            await self.loop.run_in_executor(None, self.engine.shutdown)
+
+    # --- State ---
+    def track(self):
+        engine = self.engine
+        position = engine.playlist_position
+        title = engine.playlist[position][2] if 0 <= position < len(engine.playlist) else None
+        return {"title": title, "position": position, "playlist_length": len(engine.playlist), "max_ms": engine.max_timestamp}
+
+    def progress(self):
+        engine = self.engine
+        ms = engine.song_time_now() if self.state == "playing" else engine.current_song_time_ms
+        return {"state": self.state, "ms": ms, "max_ms": engine.max_timestamp, "speed": engine.speed, "hold": engine.hold}
+
+    def telemetry(self):
+        """Rolling press lateness (ms) of the in-process engine, or None without timing stats."""
+        recorder = self.engine.recorder
+        percentiles = recorder.percentiles() if recorder is not None else None
+        if percentiles is None:
+            return None
+        p50, p95, p99 = percentiles
+        return {"p50": p50, "p95": p95, "p99": p99, "histogram": recorder.histogram()}
+
+def _positive(name, value):
+    """value if it is a finite positive number, else ValueError (checked before any state changes)."""
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 < value < math.inf:
+        raise ValueError(f"{name} must be a positive number.")
+    return value
+
+# --- Control server ---
+class ControlServer:
+    """
+    Newline-delimited JSON control of an AsyncEngine over a Unix socket or
+    loopback TCP. Requests look like {"id": 1, "cmd": "seek", "ms": 30000};
+    each gets {"id": 1, "ok": true, ...} or {"id": 1, "ok": false, "error": ...}.
+    After "subscribe", events ({"event": "track_changed", ...}) and periodic
+    "progress"/"telemetry" messages are pushed as well. Every client has its
+    own bounded send queue, so a slow client only loses its own updates.
+    """
+    def __init__(self, engine, path=None, host="127.0.0.1", port=DEFAULT_CONTROL_PORT):
+        if path is None and host not in LOOPBACK_HOSTS:
+            raise ValueError("The control server only listens on loopback addresses.")
+        self.engine = engine
+        self.path = path
+        self.host = host
+        self.port = port
+        self.server = None
+        self.connections = {} # handler task -> writer, so close() can end them cleanly
+
+    @property
+    def address(self):
+        if self.path is not None:
+            return self.path
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def start(self):
+        if self.path is not None:
+            if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.unlink(self.path) # Left over from a previous run
+            old_umask = os.umask(0o077) # Only this user may connect
+            try:
+                self.server = await asyncio.start_unix_server(self._serve_client, self.path)
+            finally:
+                os.umask(old_umask)
+        else:
+            self.server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        for writer in self.connections.values():
+            writer.close() # The handler sees end of input and finishes
+        await asyncio.gather(*self.connections)
+        await self.server.wait_closed()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve_client(self, reader, writer):
+        client = _Client(self.engine, writer)
+        sender = asyncio.create_task(client.send_loop())
+        handler = asyncio.current_task()
+        self.connections[handler] = writer
+        try:
+            while line := await reader.readline():
+                client.send(await self._handle(client, line))
+        except (ConnectionError, ValueError): # ValueError: a line over the stream limit
+            pass
+        finally:
+            del self.connections[handler]
+            client.close()
+            sender.cancel()
+            writer.close()
+
+    async def _handle(self, client, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object.")
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"Bad request: {e}"}
+        reply = {"id": request.get("id"), "ok": True}
+        try:
+            handler = COMMANDS.get(request.get("cmd"))
+            if handler is None:
+                raise ValueError(f"Unknown command {request.get('cmd')!r}.")
+            result = await handler(self.engine, client, request)
+            if result:
+                reply.update(result)
+        except Exception as e:
+            reply = {"id": request.get("id"), "ok": False, "error": str(e)}
+        return reply
+
+class _Client:
+    """One connection: its send queue and its progress/telemetry tasks."""
+    def __init__(self, engine, writer):
+        self.engine = engine
+        self.writer = writer
+        self.outbox = asyncio.Queue(CONTROL_QUEUE_SIZE)
+        self.events = None # Engine event queue while subscribed to "events"
+        self.tasks = {} # topic -> periodic task
+
+    def send(self, message):
+        if self.outbox.full():
+            self.outbox.get_nowait()
+        self.outbox.put_nowait(message)
+
+    async def send_loop(self):
+        while True:
+            message = await self.outbox.get()
+            self.writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+            await self.writer.drain()
+
+    def subscribe(self, topics, interval_ms):
+        for topic in topics:
+            self.unsubscribe([topic])
+            if topic == "events":
+                self.events = self.engine.subscribe()
+                self.tasks[topic] = asyncio.create_task(self._forward_events(self.events))
+            elif topic == "progress":
+                self.tasks[topic] = asyncio.create_task(self._every(max(interval_ms, MIN_PROGRESS_INTERVAL_MS), topic, self.engine.progress))
+            elif topic == "telemetry":
+                self.tasks[topic] = asyncio.create_task(self._every(max(interval_ms, MIN_TELEMETRY_INTERVAL_MS), topic, self.engine.telemetry))
+            else:
+                raise ValueError(f"Unknown topic {topic!r}.")
+
+    def unsubscribe(self, topics):
+        for topic in topics:
+            task = self.tasks.pop(topic, None)
+            if task is not None:
+                task.cancel()
+            if topic == "events" and self.events is not None:
+                self.engine.unsubscribe(self.events)
+                self.events = None
+
+    def close(self):
+        self.unsubscribe(list(self.tasks))
+
+    async def _forward_events(self, events):
+        while True:
+            self.send(await events.get())
+
+    async def _every(self, interval_ms, topic, read):
+        """Sends read()'s snapshot every interval_ms; only reads state, never touches the playback thread."""
+        last = None
+        while True:
+            snapshot = read()
+            if snapshot is not None and snapshot != last: # Nothing is repeated while stopped or paused
+                self.send({"event": topic, **snapshot})
+                last = snapshot
+            await asyncio.sleep(interval_ms / 1000)
+
+# --- Commands ---
+async def _load(engine, client, request):
+    files = request.get("files") or [request["file"]]
+    return await engine.load(files, request.get("song"))
+
+async def _play(engine, client, request):
+    await engine.play(request.get("speed"), request.get("hold"), request.get("start_ms"))
+
+async def _pause(engine, client, request):
+    engine.pause()
+
+async def _resume(engine, client, request):
+    engine.resume()
+
+async def _seek(engine, client, request):
+    engine.seek(request["ms"])
+
+async def _speed(engine, client, request):
+    engine.set_speed(request["speed"])
+
+async def _stop(engine, client, request):
+    await engine.stop()
+
+async def _status(engine, client, request):
+    return {**engine.progress(), **engine.track()}
+
+async def _telemetry(engine, client, request):
+    return {"telemetry": engine.telemetry()}
+
+async def _subscribe(engine, client, request):
+    client.subscribe(request.get("topics", ["events", "progress"]), request.get("interval_ms", 100))
+
+async def _unsubscribe(engine, client, request):
+    client.unsubscribe(request.get("topics", list(client.tasks)))
+
+COMMANDS = {
+    "load": _load,
+    "play": _play,
+    "pause": _pause,
+    "resume": _resume,
+    "seek": _seek,
+    "speed": _speed,
+    "stop": _stop,
+    "status": _status,
+    "telemetry": _telemetry,
+    "subscribe": _subscribe,
+    "unsubscribe": _unsubscribe,
+}
@@ -0,0 +1,423 @@
+"""Tk-free playback engine."""
+import os
+import queue
+import threading
+
+from .parsing import DEFAULT_KEY_MAPPING, is_midi_file, list_songs, load_song, normalize_song
+from .midi import load_midi
+from .timing import PrecisionTimer
+from .backends import KeyboardBackend
+from .telemetry import TimingRecorder
+from .actuation import DEFAULT_NUDGE_MS, REPRESS_GAP_NS, KeyActuator
+from .analysis import safe_hold_s
+
+# --- Playback engine ---
+def build_playlist(filepaths, song_number=None):
+    """Expands files into playlist items: every song of each file, or only song_number (1-based)."""
+    playlist = []
+    for filepath in filepaths:
+        if song_number is not None:
+            playlist.append((filepath, song_number - 1, f"{os.path.basename(filepath)} #{song_number}"))
+            continue
+        for song_index, title in enumerate(list_songs(filepath)):
+            playlist.append((filepath, song_index, title))
+    return playlist
+
+def plan_limits(speed, key_gap_ms=0, max_rate=0, nudge_ms=DEFAULT_NUDGE_MS):
+    """
+    compile_plan's rate-limit arguments (song ms) for limits given in real
+    time: key_gap_ms between presses of one key, max_rate presses per second
+    over all keys, and notes moved by at most nudge_ms.
+    """
+    return key_gap_ms * speed, (1000 / max_rate * speed if max_rate else 0), nudge_ms * speed
+
+class EventChannel:
+    """
+    One-way channel from engine threads to a consumer thread (the Tk thread).
+    Any thread may post(); the consumer calls drain() on its own thread, which
+    runs the queued handlers there, in order. Posting never blocks, so the
+    playback thread cannot be held up by the consumer.
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def post(self, handler, *args):
+        self._queue.put((handler, args))
+
+    def callback(self, handler):
+        """A callback that, when called from any thread, queues handler with its arguments."""
+        return lambda *args: self.post(handler, *args)
+
+    def drain(self):
+        """
+        Runs every queued handler on the calling thread; returns how many ran.
+        A handler that raises is reported and skipped, so the ones after it
+        (on_exit in particular) still run.
+        """
+        count = 0
+        while True:
+            try:
+                handler, args = self._queue.get_nowait()
+            except queue.Empty:
+                return count
+            try:
+                handler(*args)
+            except Exception as e:
+                print(f"Error in {getattr(handler, '__name__', handler)}: {e!r}")
+            count += 1
+
+class PlaybackEngine:
+    """
+    Tk-free playback engine: owns the current song, the playlist, the clock
+    and the key actuator, and runs the scheduler either on its own thread
+    (play) or inline (run). The on_* callbacks are invoked from the playback
+    thread; the GUI marshals them onto the Tk thread.
+    """
+    def __init__(self, backend=None, clock=None, key_mapping=None, song_cache=None):
+        self.clock = clock if clock is not None else PrecisionTimer()
+        self.backend = backend if backend is not None else KeyboardBackend()
+        self.key_mapping = key_mapping or DEFAULT_KEY_MAPPING
+        self.song_cache = song_cache
+        self.normalize = None # Keyword arguments for normalize_song, applied on load; None leaves songs as exported
+        self.midi_options = None # Keyword arguments for load_midi (transpose, fold, ...)
+        self.rate_limits = None # {"key_gap_ms", "max_rate", "nudge_ms"} in real time, see plan_limits; None plays notes as written
+        self.auto_hold = False # Shorten the hold per song so no key is held into its next press (needs NumPy)
+        self.actuator = KeyActuator(self.backend, self.clock)
+
+        self.song = None # CompiledSong being played
+        self.max_timestamp = 0
+        self.current_song_time_ms = 0 # In milliseconds, song's internal time
+        self.start_ns = 0 # Clock time at which song time 0 is (or would have been) played
+        self.speed = 1.0
+        self.hold = 0.25
+
+        self.thread = None
+        self.stop_event = threading.Event() # Used to signal the playback thread to stop
+        self.pause_event = threading.Event() # Used to signal pause (clear) and resume (set)
+        self.pause_event.set()
+        self.wake_event = threading.Event() # Interrupts the scheduler's wait on stop/pause/seek
+        self.seek_target_ms = -1 # Target time for seeking, -1 means no seek request
+        self.speed_changed = False # The pending seek is a speed change: keep notes sounding, start none
+        self.speed_plan = None # (song, plan) built on the loader for the pending speed change
+        self._speed_request = None # Latest set_speed() value still being planned
+
+        # Playlist: list of (filepath, song_index, title); position -1 means nothing from it is loaded yet
+        self.playlist = []
+        self.playlist_position = -1
+        self.next_song_future = None
+        self._loader = None
+
+        self.recorder = None # TimingRecorder, see enable_telemetry()
+
+        self.on_finished = None # Played to the end of the song/playlist
+        self.on_track_changed = None # Moved on to the next playlist item
+        self.on_status = None # Called with a message (skipped items, errors)
+        self.on_exit = None # Playback thread is about to exit (always called)
+
+    @property
+    def loader(self):
+        """Single-worker executor used to load songs in the background."""
+        if self._loader is None:
+            import concurrent.futures
+            self._loader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="SongLoader")
+        return self._loader
+
+    def load_file(self, filepath, song_index=0):
+        """Loads and compiles a song (through the cache when there is one), then normalises it if enabled."""
+        if is_midi_file(filepath):
+            song = load_midi(filepath, self.key_mapping, **(self.midi_options or {})) # Fast enough to skip the cache
+        elif self.song_cache is not None:
+            song = self.song_cache.load(filepath, self.key_mapping, song_index)
+        else:
+            song = load_song(filepath, self.key_mapping, song_index)
+        if self.normalize is not None and song:
+            song, _ = normalize_song(song, **self.normalize)
+        return song
+
+    def set_song(self, song):
+        self.song = song
+        self.max_timestamp = song.max_timestamp if song is not None else 0
+        self.current_song_time_ms = 0
+
+    def enable_telemetry(self, enabled=True, capacity=1 << 17):
+        """Turns per-note timing recording on or off (takes effect on the next play)."""
+        if enabled:
+            if self.recorder is None or self.recorder.capacity != capacity:
+                self.recorder = TimingRecorder(capacity)
+        else:
+            self.recorder = None
+        self.actuator.recorder = self.recorder
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def play(self, speed, hold, start_ms=0):
+        """Starts playback on a background thread."""
+        self._prepare(speed, hold, start_ms)
+        self.thread = threading.Thread(target=self._playback_loop, name="Playback", daemon=True)
+        self.thread.start()
+
+    def run(self, speed, hold, start_ms=0):
+        """Plays on the calling thread and returns when playback ends."""
+        self._prepare(speed, hold, start_ms)
+        self._playback_loop()
+
+    def _prepare(self, speed, hold, start_ms):
+        if not (speed > 0 and hold > 0):
+            raise ValueError("Speed and hold must be positive.")
+        self.speed = speed
+        self.hold = hold
+        self.stop_event.clear()
+        self.pause_event.set()
+        self.wake_event.clear()
+        self.seek_target_ms = -1
+        self.speed_changed = False
+        self.speed_plan = None
+        self._speed_request = None
+        if self.recorder is not None:
+            self.recorder.reset()
+        self.current_song_time_ms = start_ms
+        self.start_ns = self.clock.now_ns() - self._song_to_clock_ns(start_ms)
+        self._preload_next_song() # Parse the next playlist item while this one plays
+
+    def pause(self):
+        self.pause_event.clear() # Signal playback loop to pause (wait)
+        self.wake_event.set() # Interrupt the scheduler's sleep
+        self.current_song_time_ms = self.song_time_now()
+
+    def resume(self):
+        # Recalculate start time to account for pause duration
+        self.start_ns = self.clock.now_ns() - self._song_to_clock_ns(self.current_song_time_ms)
+        self.pause_event.set() # Signal playback loop to continue
+
+    def seek(self, ms):
+        """Moves playback to song time ms (applied on resume when paused)."""
+        self.speed_changed = False
+        self._request_seek(ms)
+
+    def _request_seek(self, ms):
+        self.seek_target_ms = ms
+        self.current_song_time_ms = ms
+        if self.pause_event.is_set():
+            self.start_ns = self.clock.now_ns() - self._song_to_clock_ns(ms)
+            self.wake_event.set() # Interrupt the scheduler so it re-positions now
+
+    def set_speed(self, speed):
+        """
+        Changes the speed multiplier; a running song carries on from where it
+        is at the new speed. The new plan is built on the loader thread, so
+        playback keeps going at the old speed until it is ready.
+        """
+        song = self.song
+        if not self.is_running() or song is None:
+            self.speed = speed
+            return
+        self._speed_request = speed
+        future = self.loader.submit(self._plan, song, self.hold, speed)
+        future.add_done_callback(lambda done: self._apply_speed(speed, song, done))
+
+    def _apply_speed(self, speed, song, future):
+        if speed != self._speed_request or not self.is_running():
+            return # Superseded by a later set_speed(), or playback ended meanwhile
+        self._speed_request = None
+        try:
+            self.speed_plan = (song, future.result())
+        except Exception:
+            self.speed_plan = None # The scheduler plans it itself (and reports the error)
+        ms = self.song_time_now() if self.pause_event.is_set() else self.current_song_time_ms
+        self.speed = speed
+        self.speed_changed = True
+        self._request_seek(ms) # The scheduler switches to speed_plan when it applies the seek
+
+    def stop(self):
+        self.stop_event.set()  # Signal thread to stop
+        self.pause_event.set() # Unblock if paused, so it can see the stop_event
+        self.wake_event.set()  # Interrupt the scheduler's sleep
+
+    def release_all(self):
+        self.actuator.release_all()
+
+    def shutdown(self):
+        self.stop()
+        if self.is_running():
+            self.thread.join(timeout=0.5) # Brief wait
+        self.actuator.release_all()
+        if self._loader is not None:
+            self._loader.shutdown(wait=False, cancel_futures=True)
+
+    def song_time_now(self):
+        """Song time in ms derived from the playback clock (no per-ms ticking needed)."""
+        elapsed_ns = self.clock.now_ns() - self.start_ns
+        return max(0, min(int(elapsed_ns * self.speed / 1e6), self.max_timestamp))
+
+    def _song_to_clock_ns(self, ms):
+        return round(ms * 1e6 / self.speed)
+
+    def _emit(self, callback, *args):
+        if callback is not None:
+            callback(*args)
+
+    def _playback_loop(self):
+        """
+        The actual playback logic. Plays the current song and, in playlist
+        mode, chains straight into the preloaded next item.
+        """
+        # adjusted_duration = self.hold / self.speed # if you want notes shorter at high speed
+        adjusted_duration = self.hold # Keep note duration constant
+
+        try:
+            if self.song is None: # Nothing loaded yet: start from the playlist
+                self.set_song(self._take_next_song())
+                if self.song is not None:
+                    self._emit(self.on_track_changed)
+                    self._preload_next_song()
+            while self.song is not None and self._play_events(self.song, adjusted_duration):
+                next_song = self._take_next_song()
+                if next_song is None:
+                    self._emit(self.on_finished)
+                    break
+                # Gapless hand-off: the next song's clock starts where this one ended, plus the
+                # re-press gap, so a key ending one song and starting the next is seen to go up
+                self.start_ns += self._song_to_clock_ns(self.max_timestamp) + int(adjusted_duration * 1e9) + self._up_ns()
+                self.set_song(next_song)
+                self._emit(self.on_track_changed)
+                self._preload_next_song()
+
+        except Exception as e:
+            print(f"Error in playback loop: {e}")
+            self._emit(self.on_status, f"Playback error: {e}")
+        finally:
+            self.release_all()
+            self._emit(self.on_exit)
+
+    def _play_events(self, song, adjusted_duration):
+        """
+        Replays the song's actuation plan, sleeping straight to the next
+        press/release group instead of ticking every millisecond.
+        Returns True if the song played to its end, False if it was stopped.
+        """
+        plan = self._plan(song, adjusted_duration)
+        timeline = plan.times
+        apply = self.actuator.apply
+        wait_until_ns = self.clock.wait_until_ns
+        wake_event = self.wake_event
+        ns_per_ms = 1e6 / self.speed
+
+        # Index of the next group to apply, starting from current_song_time_ms
+        next_index = plan.index_at(self.current_song_time_ms)
+        self.actuator.restore(plan, next_index)
+
+        while next_index < len(timeline):
+            wake_event.clear()
+            if self.stop_event.is_set():
+                return False # Exit if stop is signalled
+
+            if not self.pause_event.is_set():
+                self.actuator.release_all() # Nothing stays held while paused
+                self.pause_event.wait() # Block while paused
+                if self.seek_target_ms == -1 and not self.stop_event.is_set():
+                    self.actuator.restore(plan, next_index)
+                continue
+
+            # --- Seeking Logic ---
+            if self.seek_target_ms != -1:
+                seek_ms = self.seek_target_ms
+                self.seek_target_ms = -1 # Reset seek request
+                # A speed change carries on with the next unplayed group (presses keep their song times)
+                resume_ms = timeline[next_index] if self.speed_changed and next_index < len(timeline) else seek_ms
+                speed_plan, self.speed_plan = self.speed_plan, None
+                if self.speed_changed and speed_plan is not None and speed_plan[0] is song:
+                    plan = speed_plan[1]
+                else:
+                    plan = self._plan(song, adjusted_duration) # The same plan unless the speed changed
+                timeline = plan.times
+                ns_per_ms = 1e6 / self.speed
+                next_index = plan.index_at(resume_ms)
+                self.actuator.restore(plan, next_index, not self.speed_changed) # Snapshot + a few groups, not a replay from 0
+                self.speed_changed = False
+                self.current_song_time_ms = seek_ms # Update shared variable
+                # Adjust start_ns to reflect the jump
+                self.start_ns = self.clock.now_ns() - self._song_to_clock_ns(seek_ms)
+                continue
+
+            event_ms = timeline[next_index]
+            scheduled_ns = self.start_ns + round(event_ms * ns_per_ms)
+            if not wait_until_ns(scheduled_ns, wake_event):
+                continue # Woken early, re-check stop/pause/seek
+
+            apply(plan, next_index, scheduled_ns)
+            self.current_song_time_ms = min(int(event_ms), self.max_timestamp) # Update for GUI progress
+            next_index += 1
+
+        # The plan ends with the last release; wait out the rest of the final hold
+        while not self.stop_event.is_set():
+            wake_event.clear()
+            if not self.pause_event.is_set():
+                self.pause_event.wait()
+                continue
+            end_ns = self.start_ns + self._song_to_clock_ns(self.max_timestamp) + int(adjusted_duration * 1e9)
+            if wait_until_ns(end_ns, wake_event):
+                return True
+        return False
+
+    def _up_ns(self):
+        """Real time a key stays up between a release and its next press (see compile_plan)."""
+        return max(REPRESS_GAP_NS, int(self.rate_limits["key_gap_ms"] * 1e6 / 2) if self.rate_limits else 0)
+
+    def actuation_plan(self, song):
+        """The ActuationPlan song plays with at the current speed, hold and rate limits."""
+        return self._plan(song, self.hold)
+
+    def _plan(self, song, duration, speed=None):
+        """The song's ActuationPlan for holding each note duration seconds at speed (default the current one)."""
+        speed = speed or self.speed
+        limits = plan_limits(speed, **self.rate_limits) if self.rate_limits else ()
+        if self.auto_hold:
+            up_ms = self._up_ns() / 1e6
+            duration = min(duration, safe_hold_s(song, speed, up_ms) or duration)
+        return song.actuation_plan(duration * 1000 * speed, REPRESS_GAP_NS / 1e6 * speed, *limits)
+
+    def _load_planned(self, filepath, song_index):
+        """Loads a playlist item and builds its plan, so switching to it costs nothing."""
+        song = self.load_file(filepath, song_index)
+        if song:
+            self._plan(song, self.hold)
+        return song
+
+    # --- Playlist ---
+    def playlist_changed(self):
+        """Call after editing the playlist during playback: queues the next item, or drops a removed one."""
+        if self.next_song_future is None or self.playlist_position + 1 >= len(self.playlist):
+            self._preload_next_song()
+
+    def _preload_next_song(self):
+        """Starts compiling the next playlist item on the background loader."""
+        self.next_song_future = None
+        next_position = self.playlist_position + 1
+        if next_position < len(self.playlist):
+            filepath, song_index, _ = self.playlist[next_position]
+            self.next_song_future = self.loader.submit(self._load_planned, filepath, song_index)
+
+    def _take_next_song(self):
+        """
+        Returns the preloaded next playlist item (waiting only if it is not ready
+        yet) and advances the playlist, or None at the end of the playlist.
+        Items that fail to load or have no notes are skipped.
+        """
+        while self.next_song_future is not None and not self.stop_event.is_set():
+            future = self.next_song_future
+            self.next_song_future = None
+            self.playlist_position += 1
+            title = self.playlist[self.playlist_position][2]
+            try:
+                next_song = future.result()
+            except Exception as e:
+                next_song = None
+                self._emit(self.on_status, f"Skipped '{title}': {e}")
+            else:
+                if not next_song:
+                    self._emit(self.on_status, f"Skipped '{title}': no valid notes.")
+            if next_song:
+                return next_song
+            self._preload_next_song()
+        return None
@@ -0,0 +1,718 @@
+"""Tkinter GUI."""
+import json
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from .parsing import DEFAULT_KEY_MAPPING, SongFormatError, describe_normalize_stats, list_songs
+from .cache import SongCache
+from .timing import PrecisionTimer
+from .backends import KeyboardBackend
+from .actuation import DEFAULT_NUDGE_MS, describe_plan_report
+from .analysis import analyze_song, density_curve, describe_analysis
+from .engine import EventChannel, PlaybackEngine
+from .process import ProcessEngine
+
+# --- GUI Application Class ---
+class PianoPlayerApp:
+    def __init__(self, master, separate_process=False):
+        self.master = master
+        master.title("Auto Piano Player")
+        master.geometry("600x360") # Adjusted size
+
+        # Add this line to make the window always on top
+        master.attributes('-topmost', True)
+
+        # Initialize key mapping (could be loaded from config later)
+        self.key_mapping = DEFAULT_KEY_MAPPING
+
+        # Playback runs in the engine; its callbacks are queued on ui_channel and
+        # applied on the Tk thread by _pump, which also refreshes progress once per frame
+        if separate_process:
+            self.engine = ProcessEngine("keyboard", self.key_mapping, SongCache())
+        else:
+            self.engine = PlaybackEngine(KeyboardBackend(), PrecisionTimer(), self.key_mapping, SongCache())
+        self.ui_channel = EventChannel()
+        self.engine.on_finished = self.ui_channel.callback(self.playback_finished)
+        self.engine.on_track_changed = self.ui_channel.callback(self.track_changed)
+        self.engine.on_exit = self.ui_channel.callback(self.cleanup_after_playback)
+
+        self.current_song_time_ms = 0 # In milliseconds, song time shown in the GUI
+        self.is_playing = False
+        self.is_paused = False
+
+        # --- Style ---
+        style = ttk.Style()
+        style.theme_use('clam') # Or 'alt', 'default', 'classic'
+
+        # --- Variables ---
+        self.filename_var = tk.StringVar(value="No file selected")
+        self.speed_multiplier_var = tk.StringVar(value="1.0")
+        self.hold_duration_var = tk.StringVar(value="0.25") # Base duration
+        self.status_var = tk.StringVar(value="Load a song to begin.")
+        self.time_display_var = tk.StringVar(value="00:00 / 00:00")
+        self.playlist_var = tk.StringVar(value="Playlist empty")
+        self.telemetry_var = tk.BooleanVar(value=False)
+        self.latency_var = tk.StringVar(value="")
+        self.merge_window_var = tk.StringVar(value="0") # Normalisation applied when a song is loaded
+        self.grid_var = tk.StringVar(value="0")
+        self.dedupe_var = tk.BooleanVar(value=False)
+        self.key_gap_var = tk.StringVar(value="0") # Rate limits applied when a song is played
+        self.max_rate_var = tk.StringVar(value="0")
+        self.auto_hold_var = tk.BooleanVar(value=False)
+        self.analysis = None # analyze_song() of the current song, None without NumPy
+        self.engine.on_status = self.ui_channel.callback(self.status_var.set)
+
+        # --- UI Elements ---
+        # File Selection
+        file_frame = ttk.LabelFrame(master, text="Song File")
+        file_frame.pack(padx=10, pady=5, fill="x")
+        ttk.Button(file_frame, text="Browse...", command=self.browse_file).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Label(file_frame, textvariable=self.filename_var, wraplength=380).pack(side=tk.LEFT, padx=5, pady=5, expand=True, fill="x")
+
+        # Playlist
+        playlist_frame = ttk.Frame(master)
+        playlist_frame.pack(padx=10, pady=0, fill="x")
+        ttk.Button(playlist_frame, text="Add to Playlist...", command=self.add_to_playlist).pack(side=tk.LEFT, padx=5)
+        ttk.Button(playlist_frame, text="Clear", command=self.clear_playlist, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(playlist_frame, textvariable=self.playlist_var, wraplength=320).pack(side=tk.LEFT, padx=5, expand=True, fill="x")
+
+        # Parameters
+        params_frame = ttk.Frame(master)
+        params_frame.pack(padx=10, pady=5, fill="x")
+
+        ttk.Label(params_frame, text="Speed:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        ttk.Entry(params_frame, textvariable=self.speed_multiplier_var, width=5).grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        ttk.Label(params_frame, text="x").grid(row=0, column=2, padx=0, pady=5, sticky="w")
+
+        ttk.Label(params_frame, text="Hold (s):").grid(row=0, column=3, padx=15, pady=5, sticky="w")
+        ttk.Entry(params_frame, textvariable=self.hold_duration_var, width=5).grid(row=0, column=4, padx=5, pady=5, sticky="w")
+
+        ttk.Checkbutton(params_frame, text="Timing stats", variable=self.telemetry_var, command=self.toggle_telemetry).grid(row=0, column=5, padx=15, pady=5, sticky="w")
+        ttk.Button(params_frame, text="Save Trace...", command=self.save_trace).grid(row=0, column=6, padx=5, pady=5, sticky="w")
+
+        ttk.Label(params_frame, text="Merge (ms):").grid(row=1, column=0, padx=5, pady=0, sticky="w")
+        ttk.Entry(params_frame, textvariable=self.merge_window_var, width=5).grid(row=1, column=1, padx=5, pady=0, sticky="w")
+        ttk.Label(params_frame, text="Grid (ms):").grid(row=1, column=3, padx=15, pady=0, sticky="w")
+        ttk.Entry(params_frame, textvariable=self.grid_var, width=5).grid(row=1, column=4, padx=5, pady=0, sticky="w")
+        self.dedupe_check = ttk.Checkbutton(params_frame, text="Drop duplicates", variable=self.dedupe_var)
+        self.dedupe_check.grid(row=1, column=5, padx=15, pady=0, sticky="w")
+        self.dedupe_choice = None # The user's own setting while Merge/Grid force duplicates off
+        self.merge_window_var.trace_add("write", self.sync_dedupe_check)
+        self.grid_var.trace_add("write", self.sync_dedupe_check)
+
+        ttk.Label(params_frame, text="Key gap (ms):").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        ttk.Entry(params_frame, textvariable=self.key_gap_var, width=5).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        ttk.Label(params_frame, text="Max rate (/s):").grid(row=2, column=3, padx=15, pady=5, sticky="w")
+        ttk.Entry(params_frame, textvariable=self.max_rate_var, width=5).grid(row=2, column=4, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(params_frame, text="Auto hold", variable=self.auto_hold_var).grid(row=2, column=5, padx=15, pady=5, sticky="w")
+        ttk.Button(params_frame, text="Preview WAV...", command=self.save_preview).grid(row=2, column=6, padx=5, pady=5, sticky="w")
+
+        # Controls
+        controls_frame = ttk.Frame(master)
+        controls_frame.pack(padx=10, pady=10)
+        self.play_button = ttk.Button(controls_frame, text="Play", command=self.play_song, width=10)
+        self.play_button.pack(side=tk.LEFT, padx=5)
+        self.pause_button = ttk.Button(controls_frame, text="Pause", command=self.pause_resume_song, state=tk.DISABLED, width=10)
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+        self.stop_button = ttk.Button(controls_frame, text="Stop", command=self.stop_song, state=tk.DISABLED, width=10)
+        self.stop_button.pack(side=tk.LEFT, padx=5)
+
+        # Seek/Progress Bar, with the song's note density drawn just above it
+        progress_frame = ttk.Frame(master)
+        progress_frame.pack(padx=10, pady=5, fill="x")
+        seek_frame = ttk.Frame(progress_frame)
+        seek_frame.pack(side=tk.LEFT, padx=5, expand=True, fill="x")
+        self.minimap = tk.Canvas(seek_frame, height=self.MINIMAP_HEIGHT, highlightthickness=0)
+        self.minimap.pack(fill="x")
+        self.minimap.bind("<Configure>", lambda event: self.draw_minimap())
+        self.seek_scale = ttk.Scale(seek_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.seek_song_slider_dragged, length=400)
+        self.seek_scale.pack(fill="x")
+        self.seek_scale.bind("<ButtonRelease-1>", self.seek_song_slider_released) # For actual seek on release
+        self.seek_scale.config(state=tk.DISABLED)
+        ttk.Label(progress_frame, textvariable=self.time_display_var, width=12).pack(side=tk.LEFT, padx=5)
+
+        # Status Bar
+        status_bar = ttk.Label(master, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.pack(side=tk.BOTTOM, fill="x")
+        latency_bar = ttk.Label(master, textvariable=self.latency_var, anchor=tk.W)
+        latency_bar.pack(side=tk.BOTTOM, fill="x")
+
+        self.master.protocol("WM_DELETE_WINDOW", self.on_closing) # Handle window close
+
+        self.update_gui_state() # Initial state
+        self._pump()
+
+    @property
+    def song(self):
+        return self.engine.song
+
+    @property
+    def max_timestamp(self):
+        return self.engine.max_timestamp
+
+    def browse_file(self):
+        filepath = filedialog.askopenfilename(
+            title="Select Song File",
+            filetypes=(("Text files", "*.txt"), ("JSON files", "*.json"), ("MIDI files", "*.mid *.midi"), ("All files", "*.*"))
+        )
+        if filepath:
+            self.engine.playlist_position = -1 # Browsed file plays first, then any queued playlist
+            self.update_playlist_display()
+            self.filename_var.set(filepath)
+            self.status_var.set(f"Selected: {filepath.split('/')[-1]}")
+            self.load_song_data()
+            self.update_gui_state()
+
+    def load_song_data(self):
+        filepath = self.filename_var.get()
+        if not filepath or filepath == "No file selected":
+            self.status_var.set("Error: No file selected to load.")
+            return False
+        if not self.apply_normalize_params():
+            return False
+        try:
+            song = self.engine.load_file(filepath)
+            if not song:
+                self.status_var.set("No valid notes found in the file.")
+                messagebox.showinfo("Info", "No valid notes found in the file.")
+                self.engine.set_song(None)
+                return False
+
+            self.set_song(song)
+            self.status_var.set(f"Loaded: {filepath.split('/')[-1]}. Max time: {self.max_timestamp / 1000:.2f}s{self.normalize_note(song)}{self.analysis_note()}")
+            return True
+        except FileNotFoundError:
+            self.status_var.set(f"Error: File not found: {filepath}")
+            messagebox.showerror("Load Error", f"File not found: {filepath}")
+        except SongFormatError as e:
+            messagebox.showerror("Load Error", str(e))
+            self.status_var.set("Error: unknown format.")
+        except (json.JSONDecodeError, KeyError) as e:
+            self.status_var.set(f"Error parsing JSON: {e}")
+            messagebox.showerror("Load Error", f"Error parsing JSON file: {e}\nEnsure it's valid JSON.")
+        except Exception as e:
+            self.status_var.set(f"Unexpected error loading file: {e}")
+            messagebox.showerror("Load Error", f"An unexpected error occurred: {e}")
+        self.engine.set_song(None)
+        return False
+
+
+    def apply_normalize_params(self):
+        """Reads the merge/grid/duplicate settings into the engine; they apply to songs loaded from now on."""
+        try:
+            merge_window = int(self.merge_window_var.get())
+            grid = int(self.grid_var.get())
+            if merge_window < 0 or grid < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Merge and grid must be whole numbers of milliseconds (0 or more).")
+            return False
+        if merge_window or grid or self.dedupe_var.get():
+            self.engine.normalize = {"merge_window_ms": merge_window, "grid_ms": grid, "dedupe": True}
+        else:
+            self.engine.normalize = None
+        return True
+
+    def sync_dedupe_check(self, *_):
+        """Merge and Grid always drop duplicates (as on the command line): show that on the checkbox."""
+        try:
+            implied = int(self.merge_window_var.get() or 0) > 0 or int(self.grid_var.get() or 0) > 0
+        except ValueError:
+            return # Reported when the settings are applied
+        if implied and self.dedupe_choice is None:
+            self.dedupe_choice = self.dedupe_var.get()
+            self.dedupe_var.set(True)
+            self.dedupe_check.state(["disabled"])
+        elif not implied and self.dedupe_choice is not None:
+            self.dedupe_var.set(self.dedupe_choice)
+            self.dedupe_choice = None
+            self.dedupe_check.state(["!disabled"])
+
+    def apply_rate_limits(self):
+        """Reads the key gap/max rate settings into the engine; they apply from the next Play."""
+        try:
+            key_gap = int(self.key_gap_var.get())
+            max_rate = int(self.max_rate_var.get())
+            if key_gap < 0 or max_rate < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Key gap and max rate must be whole numbers (0 turns them off).")
+            return False
+        if key_gap or max_rate:
+            self.engine.rate_limits = {"key_gap_ms": key_gap, "max_rate": max_rate, "nudge_ms": DEFAULT_NUDGE_MS}
+        else:
+            self.engine.rate_limits = None
+        return True
+
+    def plan_note(self, song):
+        """What the plan changes for the song at the current settings: a shortened hold, rate-limit changes."""
+        if not (self.engine.rate_limits or self.engine.auto_hold):
+            return ""
+        plan = self.engine.actuation_plan(song) # Built here once; the engine reuses it
+        note = ""
+        hold = plan.hold_ms / 1000 / self.engine.speed
+        if hold < self.engine.hold:
+            note += f" Hold shortened to {hold:.3f}s."
+        if plan.report:
+            note += f" {describe_plan_report(plan.report, plan.key_chars, self.engine.speed)}"
+        return note
+
+    # --- Song analysis ---
+    MINIMAP_HEIGHT = 18
+    MINIMAP_BAR_PX = 3
+
+    def analyze_current_song(self):
+        """Analyses the current song at the entered speed and hold, and redraws the density map."""
+        self.analysis = None
+        if self.song:
+            try:
+                speed = float(self.speed_multiplier_var.get())
+                hold = float(self.hold_duration_var.get())
+            except ValueError:
+                speed, hold = 1.0, 0.25
+            try:
+                self.analysis = analyze_song(self.song, speed if speed > 0 else 1.0, hold if hold > 0 else 0.25)
+            except ImportError: # NumPy not installed: no analysis, no density map
+                pass
+        self.draw_minimap()
+
+    def analysis_note(self):
+        if self.analysis is None:
+            return ""
+        try:
+            hold = float(self.hold_duration_var.get())
+        except ValueError:
+            hold = None
+        return f" | {describe_analysis(self.analysis, hold)}"
+
+    def draw_minimap(self):
+        """Notes-per-second bars across the song, aligned with the seek bar."""
+        canvas = self.minimap
+        canvas.delete("all")
+        width = canvas.winfo_width()
+        if self.analysis is None or width <= 1:
+            return
+        densities = density_curve(self.song, max(1, width // self.MINIMAP_BAR_PX))
+        peak = max(densities) or 1
+        bar_width = width / len(densities)
+        for i, density in enumerate(densities):
+            if density:
+                top = self.MINIMAP_HEIGHT * (1 - density / peak)
+                canvas.create_rectangle(i * bar_width, top, (i + 1) * bar_width, self.MINIMAP_HEIGHT, fill="#7fa7d9", width=0)
+
+    def normalize_note(self, song):
+        return f" ({describe_normalize_stats(song.normalize_stats)})" if song.normalize_stats else ""
+
+    def set_song(self, song):
+        """Makes a compiled song the current one and resets the seek bar and density map."""
+        self.engine.set_song(song)
+        self.analyze_current_song()
+        self.seek_scale.config(to=self.max_timestamp, state=tk.NORMAL if self.max_timestamp > 0 else tk.DISABLED)
+        self.current_song_time_ms = 0
+        self.seek_scale.set(0)
+        self.update_time_display()
+
+    def get_playback_params(self):
+        try:
+            speed = float(self.speed_multiplier_var.get())
+            if speed <= 0:
+                messagebox.showerror("Error", "Speed multiplier must be positive.")
+                return None, None
+        except ValueError:
+            messagebox.showerror("Error", "Invalid speed multiplier. Please enter a number.")
+            return None, None
+
+        try:
+            hold = float(self.hold_duration_var.get())
+            if hold <= 0:
+                messagebox.showerror("Error", "Hold duration must be positive.")
+                return None, None
+        except ValueError:
+            messagebox.showerror("Error", "Invalid hold duration. Please enter a number.")
+            return None, None
+        return speed, hold
+
+    def play_song(self):
+        if self.is_playing and not self.is_paused: # Already playing
+            return
+        if not self.song:
+            if not self.load_song_data(): # Try to load if not already
+                return
+
+        if self.engine.is_running() and self.is_paused:
+            # If paused, just resume the existing playback
+            self.pause_resume_song()
+            return
+
+        speed, hold = self.get_playback_params()
+        if speed is None: return
+        if not self.apply_rate_limits(): return
+        self.engine.auto_hold = self.auto_hold_var.get() and self.analysis is not None # Needs NumPy, like the analysis
+
+        # Starting fresh
+        self.is_playing = True
+        self.is_paused = False
+
+        # If current_song_time_ms is at the end, reset to start for re-play
+        if self.current_song_time_ms >= self.max_timestamp:
+            self.current_song_time_ms = 0
+            self.seek_scale.set(0)
+
+        self.engine.speed, self.engine.hold = speed, hold # So the plan reported below is the one that plays
+        self.status_var.set(f"Playing... (Speed: {speed}x, Hold: {hold}s){self.plan_note(self.song)}")
+        self.engine.play(speed, hold, self.current_song_time_ms)
+        self.update_gui_state()
+
+    # --- Playlist ---
+    def add_to_playlist(self):
+        filepaths = filedialog.askopenfilenames(
+            title="Add Songs to Playlist",
+            filetypes=(("Text files", "*.txt"), ("JSON files", "*.json"), ("MIDI files", "*.mid *.midi"), ("All files", "*.*"))
+        )
+        if not filepaths:
+            return
+        added = 0
+        for filepath in filepaths:
+            try:
+                titles = list_songs(filepath)
+            except Exception as e:
+                messagebox.showerror("Playlist Error", f"Could not read {filepath}: {e}")
+                continue
+            for song_index, title in enumerate(titles):
+                self.engine.playlist.append((filepath, song_index, title))
+                added += 1
+        self.status_var.set(f"Added {added} song(s) to playlist.")
+        if self.is_playing:
+            self.engine.playlist_changed()
+        elif added and self.engine.playlist_position < 0 and not self.song:
+            self.load_playlist_item(0)
+        self.update_playlist_display()
+
+    def clear_playlist(self):
+        if self.is_playing:
+            # Keep the current item, drop everything queued after it
+            del self.engine.playlist[self.engine.playlist_position + 1:]
+            self.engine.playlist_changed()
+        else:
+            self.engine.playlist = []
+            self.engine.playlist_position = -1
+        self.update_playlist_display()
+
+    def load_playlist_item(self, position):
+        """Loads a playlist item on the background loader without blocking the GUI."""
+        if not self.apply_normalize_params():
+            return
+        filepath, song_index, title = self.engine.playlist[position]
+        self.engine.playlist_position = position
+        self.filename_var.set(filepath)
+        self.status_var.set(f"Loading '{title}'...")
+        future = self.engine.loader.submit(self.engine.load_file, filepath, song_index)
+        future.add_done_callback(lambda done: self.ui_channel.post(self._playlist_item_loaded, done, title))
+
+    def _playlist_item_loaded(self, future, title):
+        try:
+            song = future.result()
+        except Exception as e:
+            self.status_var.set(f"Error loading '{title}': {e}")
+            messagebox.showerror("Load Error", f"Could not load '{title}': {e}")
+            return
+        if not song:
+            self.status_var.set(f"No valid notes found in '{title}'.")
+            return
+        self.set_song(song)
+        self.status_var.set(f"Loaded: {title}. Max time: {self.max_timestamp / 1000:.2f}s{self.normalize_note(song)}{self.analysis_note()}")
+        self.update_playlist_display()
+        self.update_gui_state()
+
+    def track_changed(self):
+        """Called on the GUI thread after the playback thread moved to the next playlist item."""
+        self.seek_scale.config(to=max(self.max_timestamp, 1))
+        self.analyze_current_song()
+        filepath, _, title = self.engine.playlist[self.engine.playlist_position]
+        self.filename_var.set(filepath)
+        notes = f"{self.normalize_note(self.song)}{self.plan_note(self.song)}" if self.song else "" # None if the process engine could not mirror it
+        self.status_var.set(f"Playing '{title}'...{notes}")
+        self.update_playlist_display()
+        self.update_progress()
+
+    def update_playlist_display(self):
+        playlist = self.engine.playlist
+        position = self.engine.playlist_position
+        if not playlist:
+            self.playlist_var.set("Playlist empty")
+        elif position < 0:
+            self.playlist_var.set(f"{len(playlist)} song(s) queued")
+        else:
+            self.playlist_var.set(f"Track {position + 1}/{len(playlist)}: {playlist[position][2]}")
+
+
+    def cleanup_after_playback(self):
+        """Called when playback loop ends (normally, by stop, or error)."""
+        self.is_playing = False
+        self.is_paused = False # Ensure pause state is reset
+        self.update_gui_state()
+        self.update_latency_display()
+        # self.status_var.set("Playback stopped." if self.engine.stop_event.is_set() else "Playback finished.") # Handled by caller
+        self.release_all_keys_gui()
+
+
+    def playback_finished(self):
+        """Called when playback completes naturally."""
+        self.status_var.set("Playback finished.")
+        self.current_song_time_ms = self.max_timestamp # Ensure slider goes to end
+        self.update_progress() # Final update for slider and time display
+        # cleanup_after_playback will be called when the thread exits.
+
+    def pause_resume_song(self):
+        if not self.is_playing:
+            return
+
+        if self.is_paused: # Currently paused, so resume
+            self.is_paused = False
+            self.engine.resume()
+            self.status_var.set("Resuming...")
+        else: # Currently playing, so pause
+            self.is_paused = True
+            self.engine.pause()
+            self.current_song_time_ms = self.engine.current_song_time_ms
+            self.status_var.set("Paused.")
+        self.update_gui_state()
+
+    def stop_song(self):
+        if self.engine.is_running():
+            self.status_var.set("Stopping...")
+            self.engine.stop()
+            # cleanup_after_playback will be called when the thread exits
+            # Wait a very short time for thread to notice stop, then force GUI update
+            self.master.after(100, self._check_thread_stopped)
+        else: # If no thread, just reset state
+            self.current_song_time_ms = 0
+            self.cleanup_after_playback() # This resets GUI and flags
+            self.status_var.set("Playback stopped.")
+
+
+    def _check_thread_stopped(self):
+        if self.engine.is_running():
+            # If still alive after a bit, it might be stuck in a long sleep
+            # This is a fallback; ideally, the loop checks stop_event frequently
+            self.master.after(200, self._check_thread_stopped) # Check again
+        else:
+            # Thread has now exited, ensure everything is clean
+            self.cleanup_after_playback()
+            self.status_var.set("Playback stopped.")
+            if self.current_song_time_ms >= self.max_timestamp: # If stopped at the end
+                self.current_song_time_ms = 0 # Reset for next play
+            self.update_progress() # Update slider to current_song_time_ms (could be 0)
+
+
+    def seek_song_slider_dragged(self, value_str):
+        # This is called continuously while dragging.
+        # We only update the time display, actual seek happens on release.
+        if self.song and self.max_timestamp > 0:
+            seek_val_ms = int(float(value_str))
+            self.current_song_time_ms = seek_val_ms # Tentatively update for display
+            self.update_time_display()
+
+    def seek_song_slider_released(self, event):
+        # This is called when the user releases the mouse button on the slider.
+        if self.song and self.max_timestamp > 0:
+            seek_val_ms = int(self.seek_scale.get())
+            self.current_song_time_ms = seek_val_ms # Ensure this is also updated for immediate feedback
+
+            if self.is_playing and not self.is_paused:
+                # The playback loop picks the seek up immediately
+                self.engine.seek(seek_val_ms)
+                self.status_var.set(f"Seeking to {self.current_song_time_ms / 1000:.2f}s...")
+            elif self.is_playing and self.is_paused:
+                 # If paused, update current time. When resumed, it will start from here.
+                self.engine.seek(seek_val_ms)
+                self.status_var.set(f"Seek to {self.current_song_time_ms / 1000:.2f}s (while paused).")
+            else: # Not playing
+                self.status_var.set(f"Seek to {self.current_song_time_ms / 1000:.2f}s (stopped).")
+            self.update_time_display() # Update display based on seek
+
+    UI_REFRESH_MS = 33 # Progress is redrawn at most once per frame, however often the engine moves
+
+    def _pump(self):
+        """
+        Tk-thread heartbeat: applies everything the engine queued since the last
+        frame, then redraws progress once from the engine's clock.
+        """
+        try:
+            self.ui_channel.drain()
+            if self.is_playing and not self.is_paused:
+                self.update_progress()
+        finally:
+            self.master.after(self.UI_REFRESH_MS, self._pump) # Keep pumping whatever went wrong
+
+    def update_progress(self):
+        """Updates the GUI progress bar and time (called by _pump while playing)."""
+        if self.is_playing and not self.is_paused and self.max_timestamp > 0:
+            if self.engine.seek_target_ms == -1:
+                self.current_song_time_ms = self.engine.song_time_now()
+            self.seek_scale.set(self.current_song_time_ms)
+            self.update_time_display()
+            self.update_latency_display()
+        elif self.max_timestamp > 0: # Update display even if paused/stopped
+             self.seek_scale.set(self.current_song_time_ms)
+             self.update_time_display()
+
+
+    # --- Timing telemetry ---
+    HISTOGRAM_BARS = " ▁▂▃▄▅▆▇█"
+
+    def toggle_telemetry(self):
+        self.engine.enable_telemetry(self.telemetry_var.get())
+        if not self.telemetry_var.get():
+            self.latency_var.set("")
+        elif self.is_playing:
+            self.latency_var.set("Timing stats start with the next Play.")
+
+    def update_latency_display(self):
+        """Shows rolling lateness percentiles and a small histogram (0.5/1/2/5/10 ms buckets)."""
+        recorder = self.engine.recorder
+        if recorder is None:
+            return
+        percentiles = recorder.percentiles()
+        if percentiles is None:
+            return
+        counts = recorder.histogram()
+        peak = max(counts)
+        bars = "".join(self.HISTOGRAM_BARS[round(c / peak * (len(self.HISTOGRAM_BARS) - 1))] for c in counts)
+        p50, p95, p99 = percentiles
+        self.latency_var.set(f"Lateness ms  p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}   [{bars}] <0.5 … >10")
+
+    def save_trace(self):
+        recorder = self.engine.recorder
+        if recorder is None or recorder.count == 0:
+            messagebox.showinfo("Timing Trace", "Enable 'Timing stats' and play a song first.")
+            return
+        filepath = filedialog.asksaveasfilename(
+            title="Save Timing Trace",
+            defaultextension=".csv",
+            filetypes=(("CSV files", "*.csv"), ("All files", "*.*"))
+        )
+        if filepath:
+            with open(filepath, "w", encoding="utf-8") as file:
+                recorder.dump(file)
+            self.status_var.set(f"Saved timing trace of {min(recorder.count, recorder.capacity)} notes.")
+
+    # --- Audio preview ---
+    def save_preview(self):
+        """Renders the current song, as it would play with the entered settings, to a WAV file in the background."""
+        if not self.song:
+            messagebox.showinfo("Audio Preview", "Load a song first.")
+            return
+        if self.is_playing:
+            messagebox.showinfo("Audio Preview", "Stop playback first.")
+            return
+        speed, hold = self.get_playback_params()
+        if speed is None or not self.apply_rate_limits():
+            return
+        filepath = filedialog.asksaveasfilename(
+            title="Save Audio Preview",
+            defaultextension=".wav",
+            filetypes=(("WAV files", "*.wav"), ("All files", "*.*"))
+        )
+        if not filepath:
+            return
+        from .render import render_plan
+        self.engine.auto_hold = self.auto_hold_var.get() and self.analysis is not None
+        self.engine.speed, self.engine.hold = speed, hold
+        plan = self.engine.actuation_plan(self.song)
+        self.status_var.set("Rendering audio preview...")
+        future = self.engine.loader.submit(render_plan, plan, speed, filepath)
+        future.add_done_callback(lambda done: self.ui_channel.post(self._preview_saved, done, filepath))
+
+    def _preview_saved(self, future, filepath):
+        try:
+            seconds = future.result()
+        except ImportError as e:
+            messagebox.showerror("Audio Preview", str(e))
+            self.status_var.set("Audio preview needs NumPy.")
+            return
+        except OSError as e:
+            messagebox.showerror("Audio Preview", f"Could not write {filepath}: {e}")
+            self.status_var.set("Error writing audio preview.")
+            return
+        except Exception as e:
+            messagebox.showerror("Audio Preview", f"Could not render the preview: {e}")
+            self.status_var.set("Error rendering audio preview.")
+            return
+        self.status_var.set(f"Saved {self.format_time(seconds * 1000)} audio preview to {filepath.split('/')[-1]}.")
+
+    def format_time(self, ms):
+        if ms < 0: ms = 0
+        seconds = int((ms / 1000) % 60)
+        minutes = int((ms / (1000 * 60)) % 60)
+        return f"{minutes:02d}:{seconds:02d}"
+
+    def update_time_display(self):
+        current_t_str = self.format_time(self.current_song_time_ms)
+        total_t_str = self.format_time(self.max_timestamp)
+        self.time_display_var.set(f"{current_t_str} / {total_t_str}")
+
+    def update_gui_state(self):
+        """Enable/disable buttons based on playback state."""
+        if not self.song:
+            self.play_button.config(state=tk.DISABLED)
+            self.pause_button.config(state=tk.DISABLED)
+            self.stop_button.config(state=tk.DISABLED)
+            self.seek_scale.config(state=tk.DISABLED)
+        else:
+            self.seek_scale.config(state=tk.NORMAL)
+            if self.is_playing:
+                self.play_button.config(state=tk.DISABLED)
+                self.pause_button.config(state=tk.NORMAL, text="Resume" if self.is_paused else "Pause")
+                self.stop_button.config(state=tk.NORMAL)
+            else: # Stopped or never started
+                self.play_button.config(state=tk.NORMAL)
+                self.pause_button.config(state=tk.DISABLED, text="Pause")
+                self.stop_button.config(state=tk.DISABLED)
+
+    def release_all_keys_gui(self):
+        """Releases any potentially stuck keys (called from GUI thread)."""
+        # print("GUI: Releasing any potentially stuck keys...")
+        self.engine.release_all()
+        # print("GUI: Cleanup complete.")
+
+    def on_closing(self):
+        if self.is_playing:
+            if messagebox.askokcancel("Quit", "Song is playing. Stop playback and quit?"):
+                self.stop_song() # Attempt graceful stop
+                # Wait a moment for thread to hopefully stop
+                # This is a bit of a hack; proper thread join with timeout is better
+                # but can hang GUI if thread is unresponsive.
+                self.master.after(250, self._perform_close)
+            else:
+                return # Don't close
+        else:
+            self._perform_close()
+
+    def _perform_close(self):
+        # Ensure thread is really signalled to stop, even if stop_song had issues
+        self.engine.shutdown()
+        self.master.destroy()
+
+
+def check_keyboard_access():
+    try:
+        # This is needed for keyboard library to work correctly sometimes,
+        # especially if it needs admin rights for low-level hooks.
+        # Running the script as admin might be necessary on Windows.
+        import keyboard
+        if keyboard.is_modifier("shift"): # dummy check to initialize
+            pass
+    except Exception as e:
+        print(f"Note: Keyboard library check: {e}")
+        if "requires Sudo" in str(e) or "admin" in str(e).lower():
+            messagebox.showwarning("Permissions",
+                                   "Keyboard control might require administrator privileges (e.g., run as Sudo on Linux or 'Run as administrator' on Windows) to function correctly, especially for sending keys to other applications.")
+
+
+def run_gui(separate_process=False):
+    root = tk.Tk()
+    PianoPlayerApp(root, separate_process)
+    # The keyboard hook check runs once the window is up, so it doesn't delay the first paint
+    root.after(0, check_keyboard_access)
+    root.mainloop()
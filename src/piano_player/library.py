@@ -0,0 +1,124 @@
+"""Validating and converting whole folders of song files."""
+import os
+import json
+
+from .parsing import MAX_NOTE_TIME_MS, MIDI_EXTENSIONS, compile_song, is_midi_file, iter_songs, normalize_song, parse_key_index, preprocess_data
+from .midi import midi_song_notes
+
+# --- Library check ---
+SONG_FILE_EXTENSIONS = (".txt", ".json") + MIDI_EXTENSIONS
+
+def find_song_files(paths):
+    """
+    Yields (filepath, relative_path) for each file given and for every song
+    file found under each folder given; relative_path is relative to the
+    folder (or just the file name), for mirroring the layout on conversion.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.basename(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith(SONG_FILE_EXTENSIONS):
+                    filepath = os.path.join(root, name)
+                    yield filepath, os.path.relpath(filepath, path)
+
+def validate_notes(notes, key_mapping):
+    """
+    Counts the problems in one song's note entries: malformed entries (not a
+    {key,time} object), invalid times (not an integer, or negative), keys that
+    are malformed or not in key_mapping, and exact duplicates (same key at the
+    same time). playable is what is left to play.
+    """
+    malformed = invalid_times = unknown_keys = duplicates = 0
+    seen = set()
+    last_time = 0
+    for note in notes:
+        if not isinstance(note, dict) or "time" not in note or "key" not in note:
+            malformed += 1
+            continue
+        try:
+            note_time = int(note["time"])
+        except (ValueError, TypeError, OverflowError): # OverflowError: Infinity
+            invalid_times += 1
+            continue
+        if not 0 <= note_time <= MAX_NOTE_TIME_MS:
+            invalid_times += 1
+            continue
+        key_str = note["key"]
+        key_index = parse_key_index(key_str) if isinstance(key_str, str) else None
+        if key_index is None or key_mapping.get(key_index) is None:
+            unknown_keys += 1
+            continue
+        if (note_time, key_index) in seen:
+            duplicates += 1
+        else:
+            seen.add((note_time, key_index))
+        last_time = max(last_time, note_time)
+    return {
+        "notes": len(notes),
+        "playable": len(notes) - malformed - invalid_times - unknown_keys,
+        "malformed": malformed,
+        "invalid_times": invalid_times,
+        "unknown_keys": unknown_keys,
+        "duplicates": duplicates,
+        "duration_ms": last_time,
+    }
+
+def check_file(filepath, key_mapping, normalize=None, output_path=None, midi_options=None):
+    """
+    Parses, validates and compiles every song of one file (process pool
+    worker) and returns a JSON-serialisable report. With output_path the
+    compiled songs (normalised when normalize is given) are also written
+    there as a clean UTF-8 song list.
+    """
+    report = {"path": filepath, "songs": [], "error": None}
+    tmp_path = f"{output_path}.{os.getpid()}.tmp" if output_path else None
+    out = None
+    try:
+        if output_path:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            out = open(tmp_path, "w", encoding="utf-8")
+            out.write("[")
+        if is_midi_file(filepath):
+            songs = [(os.path.splitext(os.path.basename(filepath))[0], midi_song_notes(filepath, **(midi_options or {})))]
+        else:
+            songs = iter_songs(filepath)
+        for title, notes in songs:
+            song_report = validate_notes(notes, key_mapping)
+            song_report["title"] = title
+            timestamp_dict, _ = preprocess_data(note for note in notes if isinstance(note, dict) and "time" in note and "key" in note)
+            del notes
+            song = compile_song(timestamp_dict, key_mapping)
+            if normalize is not None and song:
+                song, stats = normalize_song(song, **normalize)
+                song_report["collapsed_events"] = stats["events_before"] - stats["events_after"]
+            song_report["events"] = len(song)
+            report["songs"].append(song_report)
+            if out is not None:
+                if len(report["songs"]) > 1:
+                    out.write(",")
+                song_notes = [{"time": song.times[i], "key": f"1Key{key_index}"}
+                              for i in range(len(song.times))
+                              for key_index in song.keys[song.offsets[i]:song.offsets[i + 1]]]
+                json.dump({"name": title, "songNotes": song_notes}, out, ensure_ascii=False, separators=(",", ":"))
+        if out is not None:
+            out.write("]")
+            out.close()
+            out = None
+            os.replace(tmp_path, output_path)
+            report["output"] = output_path
+    except (OSError, ValueError, ImportError) as e: # JSON, encoding, SongFormatError and MIDI-without-NumPy problems
+        report["error"] = str(e)
+    except (KeyError, TypeError, OverflowError) as e: # Anything else odd in one file must not end a whole library run
+        report["error"] = f"Unexpected song data: {e!r}"
+    finally:
+        if out is not None:
+            out.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return report
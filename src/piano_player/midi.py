@@ -0,0 +1,187 @@
+"""MIDI import onto the 15-key layout (needs NumPy, imported on first use)."""
+import struct
+from array import array
+
+from .parsing import CompiledSong, SongFormatError
+
+# --- MIDI import ---
+MIDI_LOWEST_PITCH = 60 # C4 is key 0; the 15 keys are the C major scale up to C6
+MIDI_OCTAVE_STEPS = 7
+MIDI_DRUM_CHANNEL = 9
+# Scale step of each pitch class: naturals map exactly, accidentals go to
+# the natural below ("down") or above ("up"), or are dropped (-1)
+MIDI_SCALE_STEPS = {
+    "down": (0, 0, 1, 1, 2, 3, 3, 4, 4, 5, 5, 6),
+    "up":   (0, 1, 1, 2, 2, 3, 4, 4, 5, 5, 6, 6),
+    "drop": (0, -1, 1, -1, 2, 3, -1, 4, -1, 5, -1, 6),
+}
+MIDI_FOLDS = ("octave", "clamp", "drop")
+
+def _import_numpy(feature="MIDI import"):
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(f"{feature} needs NumPy (pip install numpy).") from None
+    return numpy
+
+def read_midi(filepath, include_drums=False):
+    """
+    Reads a Standard MIDI File. Returns (division, note_ticks, note_pitches,
+    tempo_ticks, tempo_us) with the note-ons of all tracks (drums excluded
+    unless include_drums) and the tempo changes, as arrays in file order.
+    Raises SongFormatError if the file is not MIDI.
+    """
+    with open(filepath, "rb") as file:
+        data = file.read()
+    if data[:4] != b"MThd" or len(data) < 14:
+        raise SongFormatError("Not a MIDI file.")
+    header_length = struct.unpack_from(">I", data, 4)[0]
+    _, _, division = struct.unpack_from(">HHH", data, 8)
+    note_ticks = array("q")
+    note_pitches = array("B")
+    tempo_ticks = array("q")
+    tempo_us = array("q")
+
+    pos = 8 + header_length
+    while pos + 8 <= len(data):
+        chunk_type = data[pos:pos + 4]
+        chunk_end = min(pos + 8 + struct.unpack_from(">I", data, pos + 4)[0], len(data))
+        pos += 8
+        if chunk_type != b"MTrk":
+            pos = chunk_end
+            continue
+        tick = 0
+        status = 0
+        try:
+            while pos < chunk_end:
+                delta = 0 # Variable-length delta time
+                while True:
+                    byte = data[pos]
+                    pos += 1
+                    delta = (delta << 7) | (byte & 0x7F)
+                    if byte < 0x80:
+                        break
+                tick += delta
+                if data[pos] & 0x80:
+                    status = data[pos]
+                    pos += 1
+                elif status < 0x80 or status >= 0xF0:
+                    raise SongFormatError("Corrupt MIDI track (data byte without status).")
+                if status >= 0xF0: # Meta and sysex events carry their own length
+                    meta_type = -1
+                    if status == 0xFF:
+                        meta_type = data[pos]
+                        pos += 1
+                    length = 0
+                    while True:
+                        byte = data[pos]
+                        pos += 1
+                        length = (length << 7) | (byte & 0x7F)
+                        if byte < 0x80:
+                            break
+                    if meta_type == 0x51 and length == 3:
+                        tempo_ticks.append(tick)
+                        tempo_us.append(int.from_bytes(data[pos:pos + 3], "big"))
+                    pos += length
+                    status = 0 # Running status does not survive meta/sysex events
+                    if meta_type == 0x2F: # End of track
+                        break
+                    continue
+                kind = status & 0xF0
+                if kind == 0x90 and data[pos + 1] and (include_drums or status & 0x0F != MIDI_DRUM_CHANNEL):
+                    note_ticks.append(tick)
+                    note_pitches.append(data[pos])
+                pos += 1 if kind in (0xC0, 0xD0) else 2
+        except IndexError:
+            raise SongFormatError("Truncated MIDI track.") from None
+        pos = chunk_end
+    return division, note_ticks, note_pitches, tempo_ticks, tempo_us
+
+def midi_ticks_to_ms(np, division, ticks, tempo_ticks, tempo_us):
+    """Converts tick positions to ms through the tempo map, for all notes at once."""
+    ticks = np.asarray(ticks, dtype=np.float64)
+    if division & 0x8000: # SMPTE: frames per second and ticks per frame, no tempo map
+        frames_per_second = 256 - (division >> 8)
+        return ticks * 1000.0 / (frames_per_second * (division & 0xFF))
+    change_ticks = np.asarray(tempo_ticks, dtype=np.float64)
+    change_us = np.asarray(tempo_us, dtype=np.float64)
+    order = np.argsort(change_ticks, kind="stable") # Tracks are merged, so sort the tempo map
+    change_ticks = np.concatenate(([0.0], change_ticks[order]))
+    change_us = np.concatenate(([500000.0], change_us[order])) # 120 bpm until the first tempo event
+    # Time (us) at which each tempo segment starts
+    segment_start_us = np.concatenate(([0.0], np.cumsum(np.diff(change_ticks) * change_us[:-1] / division)))
+    segment = np.searchsorted(change_ticks, ticks, side="right") - 1
+    return (segment_start_us[segment] + (ticks - change_ticks[segment]) * change_us[segment] / division) / 1000.0
+
+def best_midi_transpose(np, pitches):
+    """Semitone shift (-24..24, smallest first on ties) that puts the most notes on in-range naturals."""
+    steps = np.asarray(MIDI_SCALE_STEPS["drop"])
+    candidates = np.array(sorted(range(-24, 25), key=abs))
+    counts = np.bincount(pitches, minlength=128) # Score pitch classes, not every note
+    shifted = np.arange(128)[None, :] + candidates[:, None] - MIDI_LOWEST_PITCH
+    fits = (shifted >= 0) & (shifted <= 2 * 12) & (steps[shifted % 12] >= 0)
+    return int(candidates[np.argmax(fits @ counts)])
+
+def midi_key_events(filepath, transpose="auto", fold="octave", accidentals="down", include_drums=False):
+    """
+    Maps a MIDI file onto the 15 Sky keys. Returns (times_ms, key_indices,
+    dropped) as NumPy arrays sorted by time then key, with duplicate
+    (time, key) pairs removed. transpose is a semitone shift or "auto";
+    pitches outside C4..C6 are folded by octaves ("octave"), pinned to the
+    nearest end ("clamp") or dropped; accidentals go "down", "up" or "drop".
+    """
+    np = _import_numpy()
+    if fold not in MIDI_FOLDS:
+        raise ValueError(f"fold must be one of {', '.join(MIDI_FOLDS)}")
+    if accidentals not in MIDI_SCALE_STEPS:
+        raise ValueError(f"accidentals must be one of {', '.join(MIDI_SCALE_STEPS)}")
+    division, note_ticks, note_pitches, tempo_ticks, tempo_us = read_midi(filepath, include_drums)
+    if not division:
+        raise SongFormatError("MIDI file has no time division.")
+    pitches = np.frombuffer(note_pitches, dtype=np.uint8).astype(np.int64)
+    if transpose == "auto":
+        transpose = best_midi_transpose(np, pitches) if len(pitches) else 0
+    relative = pitches + int(transpose) - MIDI_LOWEST_PITCH # Semitones above C4
+    top = 2 * 12
+    keep = np.ones(len(relative), dtype=bool)
+    if fold == "octave":
+        relative = np.where(relative < 0, relative % 12, relative)
+        relative = np.where(relative > top, top - (top - relative) % 12, relative) # Fewest octaves down: C7 -> C6
+    elif fold == "clamp":
+        relative = np.clip(relative, 0, top)
+    else:
+        keep = (relative >= 0) & (relative <= top)
+        relative = np.clip(relative, 0, top)
+    steps = np.asarray(MIDI_SCALE_STEPS[accidentals])[relative % 12]
+    keep &= steps >= 0
+    key_indices = relative // 12 * MIDI_OCTAVE_STEPS + steps
+    times_ms = np.rint(midi_ticks_to_ms(np, division, note_ticks, tempo_ticks, tempo_us)).astype(np.int64)
+
+    times_ms = times_ms[keep]
+    key_indices = key_indices[keep]
+    order = np.lexsort((key_indices, times_ms))
+    times_ms = times_ms[order]
+    key_indices = key_indices[order]
+    unique = np.ones(len(times_ms), dtype=bool)
+    unique[1:] = (np.diff(times_ms) != 0) | (np.diff(key_indices) != 0)
+    return times_ms[unique], key_indices[unique], int(len(pitches) - unique.sum())
+
+def load_midi(filepath, key_mapping, **options):
+    """Imports a MIDI file (see midi_key_events for the options) straight into a CompiledSong."""
+    np = _import_numpy()
+    times_ms, key_indices, dropped = midi_key_events(filepath, **options)
+    key_chars = tuple(key_mapping.get(i) for i in range(max(key_mapping, default=-1) + 1))
+    mapped = np.array([char is not None for char in key_chars] + [False], dtype=bool)
+    keep = mapped[np.minimum(key_indices, len(key_chars))]
+    times_ms = times_ms[keep]
+    key_indices = key_indices[keep]
+    event_starts = np.flatnonzero(np.concatenate(([True], np.diff(times_ms) != 0))) if len(times_ms) else np.zeros(0, np.int64)
+    times = array("I", times_ms[event_starts].astype(np.uint32).tobytes())
+    offsets = array("I", np.append(event_starts, len(key_indices)).astype(np.uint32).tobytes())
+    keys = array("B", key_indices.astype(np.uint8).tobytes())
+    return CompiledSong(times, offsets, keys, key_chars, dropped + int(len(keep) - keep.sum()))
+
+def midi_song_notes(filepath, **options):
+    """A MIDI file as note entries ({"time", "key"}), the shape song files use."""
+    times_ms, key_indices, _ = midi_key_events(filepath, **options)
+    return [{"time": t, "key": f"1Key{k}"} for t, k in zip(times_ms.tolist(), key_indices.tolist())]
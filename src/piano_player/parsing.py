@@ -0,0 +1,521 @@
+"""Song files: reading Sky exports and compiling them into array-backed songs."""
+import io
+import os
+import json
+from array import array
+from bisect import bisect_left
+
+# --- Default Configuration (can be overridden by GUI) ---
+DEFAULT_KEY_MAPPING = {
+    0: 'y', 1: 'u', 2: 'i', 3: 'o', 4: 'p',
+    5: 'h', 6: 'j', 7: 'k', 8: 'l', 9: ';',
+    10: 'n', 11: 'm', 12: ',', 13: '.', 14: '/',
+}
+MAX_NOTE_TIME_MS = 0xFFFFFFFF # Note times are stored as unsigned 32-bit ms (about 49 days)
+
+# --- Your existing key processing logic (mostly unchanged) ---
+def preprocess_data(data):
+    """
+    Processes the raw note data into a dictionary keyed by timestamp.
+    Also returns the maximum timestamp found in the data.
+    """
+    timestamp_dict = {}
+    max_timestamp = 0
+    for note in data:
+        try:
+            note_time = int(note["time"])
+        except (ValueError, TypeError, OverflowError): # OverflowError: Infinity
+            # print(f"Warning: Skipping note with invalid time format: {note}") # Log to GUI later
+            continue
+
+        key = note["key"]
+        if note_time in timestamp_dict:
+            timestamp_dict[note_time].append(key)
+        else:
+            timestamp_dict[note_time] = [key]
+        if note_time > max_timestamp:
+            max_timestamp = note_time
+    return timestamp_dict, max_timestamp
+
+def parse_key_index(key_str):
+    """
+    Parses a key string (e.g., '1Key0') into its integer key index.
+    Returns None if the string is malformed.
+    """
+    parts = key_str.split("Key")
+    if len(parts) != 2:
+        # print(f"Warning: Unexpected key format: '{key_str}'") # Log to GUI
+        return None
+
+    key_index_str_extracted = parts[1].strip()
+    if not key_index_str_extracted:
+        # print(f"Warning: Extracted empty string for key: '{key_str}'. Skipping.") # Log
+        return None
+
+    try:
+        return int(key_index_str_extracted)
+    except ValueError:
+        # print(f"ValueError: Could not parse: '{key_index_str_extracted}' from '{key_str}'") # Log
+        return None
+
+class CompiledSong:
+    """
+    Compact, array-backed song timeline ready for playback.
+    Event i happens at times[i] (ms) and presses the key indices
+    keys[offsets[i]:offsets[i + 1]]; key_chars maps a key index to the
+    keyboard character, so nothing is parsed or looked up while playing.
+    """
+    __slots__ = ("times", "offsets", "keys", "key_chars", "max_timestamp", "skipped_notes", "normalize_stats", "_chords", "_plan", "_shortest_repeat")
+
+    def __init__(self, times, offsets, keys, key_chars, skipped_notes=0):
+        self.times = times
+        self.offsets = offsets
+        self.keys = keys
+        self.key_chars = key_chars
+        self.max_timestamp = times[-1] if times else 0
+        self.skipped_notes = skipped_notes
+        self.normalize_stats = None # Set by normalize_song
+        self._chords = None
+        self._plan = None
+        self._shortest_repeat = None
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def note_count(self):
+        return len(self.keys)
+
+    def index_at(self, ms):
+        """Index of the first event at or after song time ms."""
+        return bisect_left(self.times, ms)
+
+    def chords(self):
+        """
+        Per-event tuples of keyboard characters, so a chord is dispatched as
+        one unit. Identical chords share one tuple and repeated keys within
+        an event are pressed once. Built on first use.
+        """
+        if self._chords is None:
+            table = {}
+            chords = []
+            keys = self.keys
+            offsets = self.offsets
+            for index in range(len(self.times)):
+                key_indices = tuple(keys[offsets[index]:offsets[index + 1]])
+                chord = table.get(key_indices)
+                if chord is None:
+                    chord = table[key_indices] = tuple(dict.fromkeys(self.key_chars[k] for k in key_indices))
+                chords.append(chord)
+            self._chords = chords
+        return self._chords
+
+    def actuation_plan(self, hold_ms, gap_ms, key_gap_ms=0, press_interval_ms=0, tolerance_ms=0):
+        """The ActuationPlan for this hold time and rate limits (song ms); the last one built is kept."""
+        plan = self._plan
+        limits = (key_gap_ms, press_interval_ms, tolerance_ms)
+        if plan is None or (plan.hold_ms, plan.gap_ms, plan.limits) != (hold_ms, gap_ms, limits):
+            from .actuation import compile_plan
+            plan = self._plan = compile_plan(self, hold_ms, gap_ms, *limits)
+        return plan
+
+    def shortest_repeat_ms(self):
+        """Shortest time (ms) between two presses of one key, inf if none repeats (needs NumPy; computed once)."""
+        if self._shortest_repeat is None:
+            from .analysis import shortest_repeat_ms
+            self._shortest_repeat = shortest_repeat_ms(self)
+        return self._shortest_repeat
+
+    def chord_chars(self, index):
+        """Keyboard characters pressed by event index."""
+        key_chars = self.key_chars
+        keys = self.keys
+        return [key_chars[keys[i]] for i in range(self.offsets[index], self.offsets[index + 1])]
+
+def compile_song(timestamp_dict, key_mapping):
+    """
+    Compiles the output of preprocess_data into a CompiledSong.
+    Key strings are parsed and mapped here, once, at load time; notes with
+    malformed or unmapped keys, or times outside 0..MAX_NOTE_TIME_MS, are
+    dropped and counted in skipped_notes.
+    """
+    key_chars = tuple(key_mapping.get(i) for i in range(max(key_mapping, default=-1) + 1))
+    times = array("I")
+    offsets = array("I", [0])
+    keys = array("B")
+    skipped = 0
+    for note_time in sorted(timestamp_dict):
+        if not 0 <= note_time <= MAX_NOTE_TIME_MS:
+            skipped += len(timestamp_dict[note_time])
+            continue
+        start = len(keys)
+        for key_str in timestamp_dict[note_time]:
+            key_index = parse_key_index(key_str) if isinstance(key_str, str) else None
+            if key_index is None or not 0 <= key_index < len(key_chars) or key_chars[key_index] is None:
+                skipped += 1
+                continue
+            keys.append(key_index)
+        if len(keys) > start:
+            times.append(note_time)
+            offsets.append(len(keys))
+    return CompiledSong(times, offsets, keys, key_chars, skipped)
+
+def normalize_song(song, merge_window_ms=0, grid_ms=0, dedupe=True):
+    """
+    Optional clean-up pass over a CompiledSong, returning (song, stats).
+
+    Events whose onset lies within merge_window_ms of the first onset of a
+    group are merged into that first onset, so a chord smeared over a few ms
+    becomes one dispatch. grid_ms > 0 then snaps every onset to the nearest
+    multiple of grid_ms (events landing on the same slot are merged too).
+    dedupe drops repeated keys within an event. The input is not modified.
+    """
+    times = array("I")
+    offsets = array("I", [0])
+    keys = array("B")
+    merged = snapped = duplicates = 0
+    src_times = song.times
+    src_offsets = song.offsets
+    src_keys = song.keys
+    group_start = None
+    seen = set()
+    for index in range(len(src_times)):
+        note_time = src_times[index]
+        if group_start is not None and note_time - group_start <= merge_window_ms:
+            merged += 1
+            event_time = times[-1]
+        else:
+            group_start = note_time
+            event_time = note_time
+            if grid_ms > 0:
+                event_time = int(note_time / grid_ms + 0.5) * grid_ms
+                if event_time != note_time:
+                    snapped += 1
+            if times and event_time == times[-1]:
+                merged += 1
+            else:
+                times.append(event_time)
+                offsets.append(len(keys))
+                seen.clear()
+        for i in range(src_offsets[index], src_offsets[index + 1]):
+            key_index = src_keys[i]
+            if dedupe:
+                if key_index in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key_index)
+            keys.append(key_index)
+        offsets[-1] = len(keys)
+    result = CompiledSong(times, offsets, keys, song.key_chars, song.skipped_notes)
+    stats = {
+        "events_before": len(song),
+        "events_after": len(result),
+        "merged_events": merged,
+        "snapped_events": snapped,
+        "duplicate_notes": duplicates,
+    }
+    result.normalize_stats = stats
+    return result, stats
+
+def describe_normalize_stats(stats):
+    """One-line summary of what normalize_song collapsed."""
+    return (f"{stats['events_before'] - stats['events_after']} of {stats['events_before']} events collapsed"
+            f" ({stats['snapped_events']} snapped), {stats['duplicate_notes']} duplicate notes dropped")
+
+# --- Song file loading ---
+MIDI_EXTENSIONS = (".mid", ".midi")
+
+def is_midi_file(filepath):
+    return filepath.lower().endswith(MIDI_EXTENSIONS)
+
+class SongFormatError(ValueError):
+    """Raised when a file is valid JSON but not a recognised song layout."""
+
+def sniff_encoding(head):
+    """
+    Guesses the text encoding of a song file from its first bytes.
+    Sky exports are usually UTF-16 with a BOM, but UTF-8 (with or without
+    BOM) and BOM-less UTF-16 also turn up.
+    """
+    if head.startswith((b"\xff\xfe\x00\x00", b"\x00\x00\xfe\xff")):
+        return "utf-32"
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "utf-16"
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if len(head) >= 2:
+        if head[0] == 0 and head[1] != 0:
+            return "utf-16-be"
+        if head[0] != 0 and head[1] == 0:
+            return "utf-16-le"
+    return "utf-8"
+
+_NUMBER_CONTINUATION = frozenset(".eE+-0123456789")
+
+class _JsonStream:
+    """
+    Minimal incremental JSON reader over a text stream. Containers are walked
+    element by element (items/members) and only leaf values are decoded, so
+    memory stays bounded by the largest single note rather than the file.
+    """
+    def __init__(self, text_file, chunk_size=65536):
+        self.file = text_file
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > len(self.buf) // 2:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def _error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def peek(self):
+        """Returns the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            buf = self.buf
+            while self.pos < len(buf) and buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(buf):
+                return buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                result, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            if (end == len(self.buf) or self.buf[end] in _NUMBER_CONTINUATION) and self._fill():
+                continue # A number cut at the chunk end ("1." then "5") continues in the next chunk
+            self.pos = end
+            return result
+
+    def skip(self):
+        """Skips the next value without materialising containers."""
+        char = self.peek()
+        if char == "[":
+            for _ in self.items():
+                self.skip()
+        elif char == "{":
+            for _ in self.members():
+                self.skip()
+        else:
+            self.value()
+
+    def items(self):
+        """Iterates an array; the caller must consume each element."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                self.pos -= 1
+                raise self._error("Expecting ',' delimiter")
+
+    def members(self):
+        """Iterates an object, yielding keys; the caller must consume each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error("Expecting property name enclosed in double quotes")
+            key = self.value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                self.pos -= 1
+                raise self._error("Expecting ',' delimiter")
+
+def _open_json_stream(raw_file):
+    encoding = sniff_encoding(raw_file.read(4))
+    raw_file.seek(0)
+    return _JsonStream(io.TextIOWrapper(raw_file, encoding=encoding))
+
+def _stream_notes(stream):
+    for _ in stream.items():
+        yield stream.value()
+
+def iter_song_notes(filepath, song_index=0):
+    """
+    Streams the note entries of a song file, detecting the encoding and the
+    layout on the fly:
+      A: a single dict with "songNotes" at the top
+      B: a list of song dicts (song_index selects one; reading stops after it)
+      C: a plain list of {key,time} entries
+    Raises SongFormatError for anything else. MIDI files are imported with
+    the default options of midi_key_events.
+    """
+    if is_midi_file(filepath):
+        from .midi import midi_song_notes
+        yield from midi_song_notes(filepath)
+        return
+    with open(filepath, "rb") as raw_file:
+        stream = _open_json_stream(raw_file)
+        top = stream.peek()
+
+        # Case A: single dict with "songNotes" at the top
+        if top == "{":
+            for key in stream.members():
+                if key == "songNotes":
+                    yield from _stream_notes(stream)
+                    return
+                stream.skip()
+            raise SongFormatError("Unrecognized song file format.")
+
+        if top != "[":
+            raise SongFormatError("Unrecognized song file format.")
+
+        mode = None # "songs" (case B) or "notes" (case C), decided by the first element
+        index = 0
+        checked = 0
+        for _ in stream.items():
+            if stream.peek() != "{" or (mode == "songs" and index != song_index):
+                if mode is None:
+                    raise SongFormatError("Unrecognized song file format.")
+                if mode == "songs":
+                    stream.skip()
+                    index += 1
+                else:
+                    yield stream.value()
+                continue
+
+            entry = {}
+            found = False
+            for key in stream.members():
+                if key == "songNotes" and mode != "notes":
+                    # Case B: list of song-dicts
+                    mode = "songs"
+                    if index == song_index:
+                        yield from _stream_notes(stream)
+                        found = True
+                    else:
+                        stream.skip()
+                elif mode == "songs":
+                    stream.skip()
+                else:
+                    entry[key] = stream.value()
+            if mode == "songs":
+                if found:
+                    return # Stop reading after the requested song
+                index += 1
+                continue
+
+            # Case C: plain list of {key,time} entries (first few are validated)
+            mode = "notes"
+            if checked < 5:
+                if "key" not in entry or "time" not in entry:
+                    raise SongFormatError("Unrecognized song file format.")
+                checked += 1
+            yield entry
+
+        if mode == "songs":
+            raise SongFormatError(f"Song #{song_index + 1} not found in file.")
+
+def list_songs(filepath):
+    """
+    Returns the titles of the songs in a file: one per entry of a multi-song
+    export, or a single title (the file name) for the other layouts.
+    Note arrays are skipped while streaming, so this is cheap even for big files.
+    """
+    default_title = os.path.splitext(os.path.basename(filepath))[0]
+    if is_midi_file(filepath):
+        return [default_title]
+    with open(filepath, "rb") as raw_file:
+        stream = _open_json_stream(raw_file)
+        if stream.peek() != "[":
+            return [default_title]
+        titles = []
+        for _ in stream.items():
+            if stream.peek() != "{":
+                return titles or [default_title]
+            name = None
+            is_song = False
+            for key in stream.members():
+                if key == "songNotes":
+                    is_song = True
+                    stream.skip()
+                elif key == "name":
+                    name = stream.value()
+                else:
+                    stream.skip()
+            if not is_song:
+                return [default_title] # Plain list of {key,time} entries
+            titles.append(str(name) if name else f"{default_title} #{len(titles) + 1}")
+        return titles or [default_title]
+
+def iter_songs(filepath):
+    """
+    Streams every song of a file in one pass, yielding (title, notes) with the
+    note entries of one song as a list, so only one song is in memory at a
+    time. Titles are the same as list_songs gives.
+    """
+    default_title = os.path.splitext(os.path.basename(filepath))[0]
+    if is_midi_file(filepath):
+        from .midi import midi_song_notes
+        yield default_title, midi_song_notes(filepath)
+        return
+    count = 0
+    with open(filepath, "rb") as raw_file:
+        stream = _open_json_stream(raw_file)
+        if stream.peek() == "[":
+            for _ in stream.items():
+                if stream.peek() != "{":
+                    break
+                name = None
+                notes = None
+                for key in stream.members():
+                    if key == "songNotes":
+                        notes = list(_stream_notes(stream))
+                    elif key == "name":
+                        name = stream.value()
+                    else:
+                        stream.skip()
+                if notes is None:
+                    break # Plain list of {key,time} entries
+                count += 1
+                yield (str(name) if name else f"{default_title} #{count}"), notes
+    if not count: # Single song layouts
+        yield default_title, list(iter_song_notes(filepath))
+
+def load_song(filepath, key_mapping, song_index=0):
+    """Streams a song file through preprocess_data and compiles it (MIDI files are imported directly)."""
+    if is_midi_file(filepath):
+        from .midi import load_midi
+        return load_midi(filepath, key_mapping)
+    timestamp_dict, _ = preprocess_data(iter_song_notes(filepath, song_index))
+    return compile_song(timestamp_dict, key_mapping)
@@ -0,0 +1,288 @@
+"""Running the playback engine in a separate, higher-priority process."""
+import os
+import sys
+import struct
+import threading
+from array import array
+
+from .parsing import DEFAULT_KEY_MAPPING, CompiledSong
+from .timing import PrecisionTimer
+from .backends import BACKENDS
+from .engine import PlaybackEngine
+
+# --- Engine process ---
+SHARED_SONG_HEADER = struct.Struct("<IIII") # event count, note count, skipped notes, max timestamp
+ENGINE_PROGRESS_INTERVAL_S = 1 / 30 # How often the engine process reports song time while playing
+
+def share_song(song):
+    """
+    Copies a CompiledSong's arrays into a new SharedMemory block
+    (header + times + offsets + keys). The caller closes and unlinks it.
+    """
+    from multiprocessing import shared_memory
+    columns = [memoryview(column).cast("B") for column in (song.times, song.offsets, song.keys)]
+    size = SHARED_SONG_HEADER.size + sum(column.nbytes for column in columns)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    SHARED_SONG_HEADER.pack_into(shm.buf, 0, len(song.times), len(song.keys), song.skipped_notes, song.max_timestamp)
+    position = SHARED_SONG_HEADER.size
+    for column in columns:
+        shm.buf[position:position + column.nbytes] = column
+        position += column.nbytes
+    return shm
+
+def attach_shared_song(name, key_chars):
+    """Rebuilds a CompiledSong from a block written by share_song (copying the arrays, no parsing)."""
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        n_events, n_keys, skipped, _ = SHARED_SONG_HEADER.unpack_from(shm.buf)
+        times_end = SHARED_SONG_HEADER.size + 4 * n_events
+        offsets_end = times_end + 4 * (n_events + 1)
+        times = array("I")
+        times.frombytes(shm.buf[SHARED_SONG_HEADER.size:times_end])
+        offsets = array("I")
+        offsets.frombytes(shm.buf[times_end:offsets_end])
+        keys = array("B")
+        keys.frombytes(shm.buf[offsets_end:offsets_end + n_keys])
+    finally:
+        shm.close()
+    return CompiledSong(times, offsets, keys, key_chars, skipped)
+
+def raise_process_priority():
+    """Asks the OS to schedule this process ahead of normal ones. Returns False if not allowed."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            HIGH_PRIORITY_CLASS = 0x00000080
+            kernel32 = ctypes.windll.kernel32
+            return bool(kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), HIGH_PRIORITY_CLASS))
+        os.nice(-10)
+        return True
+    except (OSError, AttributeError):
+        return False # Raising niceness usually needs root on Linux/macOS; run at normal priority
+
+def _engine_process_main(conn, backend_name, key_mapping, song_cache):
+    """Entry point of the engine process: runs a PlaybackEngine and serves ProcessEngine's commands."""
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl-C is handled by the parent, which sends "stop"
+    raise_process_priority()
+
+    clock = PrecisionTimer()
+    engine = PlaybackEngine(BACKENDS[backend_name](clock), clock, key_mapping, song_cache)
+    send_lock = threading.Lock()
+    def send(*message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except (OSError, EOFError):
+                pass # Parent went away; the command loop will notice
+    engine.on_finished = lambda: send("finished")
+    engine.on_track_changed = lambda: send("track_changed", engine.playlist_position)
+    engine.on_status = lambda message: send("status", message)
+    engine.on_exit = lambda: send("exit")
+
+    try:
+        while True:
+            running = engine.is_running()
+            if conn.poll(ENGINE_PROGRESS_INTERVAL_S if running else None):
+                try:
+                    command, *args = conn.recv()
+                except EOFError:
+                    break
+                if command == "close":
+                    break
+                if command == "song":
+                    name, key_chars = args
+                    engine.set_song(attach_shared_song(name, key_chars) if name else None)
+                    send("song_ready", name)
+                elif command == "playlist":
+                    engine.playlist, engine.playlist_position, engine.normalize, engine.midi_options, engine.rate_limits, engine.auto_hold = args
+                    if engine.is_running():
+                        engine.playlist_changed()
+                elif command in ("play", "pause", "resume", "seek", "set_speed", "stop", "release_all"):
+                    getattr(engine, command)(*args)
+            if running:
+                send("progress", engine.song_time_now())
+    finally:
+        engine.shutdown()
+
+class ProcessEngine:
+    """
+    Runs a PlaybackEngine in a separate, higher-priority process, so the Tk
+    mainloop, window dragging and GC in this process cannot delay notes.
+    Offers the PlaybackEngine interface the GUI and CLI use: commands go
+    over a Pipe, the current song is handed over through shared memory,
+    and progress comes back about 30 times a second. Playlist items after
+    the first are loaded by the engine process itself (through its cache).
+    The on_* callbacks are invoked from this process's event reader thread.
+    """
+    def __init__(self, backend_name="keyboard", key_mapping=None, song_cache=None):
+        import multiprocessing
+        self.key_mapping = key_mapping or DEFAULT_KEY_MAPPING
+        self.song_cache = song_cache
+        self.normalize = None
+        self.midi_options = None
+        self.rate_limits = None
+        self.auto_hold = False
+
+        self.song = None
+        self.max_timestamp = 0
+        self.current_song_time_ms = 0 # Last song time reported by the engine process
+        self.seek_target_ms = -1 # Seeks are applied in the engine process
+        self.speed = 1.0
+        self.hold = 0.25
+        self.playlist = []
+        self.playlist_position = -1
+        self.recorder = None # Timing telemetry stays with an in-process PlaybackEngine
+        self._loader = None
+        self._running = False
+        self._exited = threading.Event()
+        self._shared = {} # Shared memory blocks the engine process has not picked up yet
+        self._send_lock = threading.Lock()
+
+        self.on_finished = None
+        self.on_track_changed = None
+        self.on_status = None
+        self.on_exit = None
+
+        if os.name == "posix":
+            # Start the shared memory tracker before forking, so both processes use the same one
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_engine_process_main, name="PlaybackEngine", daemon=True,
+                                               args=(child_conn, backend_name, self.key_mapping, song_cache))
+        self.process.start()
+        child_conn.close()
+        self._reader = threading.Thread(target=self._read_events, name="EngineEvents", daemon=True)
+        self._reader.start()
+
+    # Loading happens in this process, exactly as for PlaybackEngine
+    loader = PlaybackEngine.loader
+    load_file = PlaybackEngine.load_file
+    _emit = PlaybackEngine._emit
+    # Plans are built here only to report on them; the engine process builds its own
+    actuation_plan = PlaybackEngine.actuation_plan
+    _plan = PlaybackEngine._plan
+    _up_ns = PlaybackEngine._up_ns
+
+    def set_song(self, song):
+        self.song = song
+        self.max_timestamp = song.max_timestamp if song is not None else 0
+        self.current_song_time_ms = 0
+        if song:
+            shm = share_song(song)
+            self._shared[shm.name] = shm
+            self._send("song", shm.name, song.key_chars)
+        else:
+            self._send("song", None, None)
+
+    def enable_telemetry(self, enabled=True, capacity=1 << 17):
+        if enabled:
+            self._emit(self.on_status, "Timing stats are only available when playing in-process.")
+
+    def is_running(self):
+        return self._running
+
+    def play(self, speed, hold, start_ms=0):
+        self.speed = speed
+        self.hold = hold
+        self.current_song_time_ms = start_ms
+        self._running = True
+        self._exited.clear()
+        self._send("playlist", list(self.playlist), self.playlist_position, self.normalize, self.midi_options, self.rate_limits, self.auto_hold)
+        self._send("play", speed, hold, start_ms)
+
+    def run(self, speed, hold, start_ms=0):
+        """Plays and waits for the engine process to finish (for the CLI)."""
+        self.play(speed, hold, start_ms)
+        while not self._exited.wait(0.1): # Short waits keep Ctrl-C responsive
+            pass
+
+    def pause(self):
+        self._send("pause")
+
+    def resume(self):
+        self._send("resume")
+
+    def seek(self, ms):
+        self.current_song_time_ms = ms
+        self._send("seek", ms)
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self._send("set_speed", speed)
+
+    def stop(self):
+        self._send("stop")
+
+    def release_all(self):
+        self._send("release_all")
+
+    def playlist_changed(self):
+        self._send("playlist", list(self.playlist), self.playlist_position, self.normalize, self.midi_options, self.rate_limits, self.auto_hold)
+
+    def shutdown(self):
+        self._send("close")
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        for shm in self._shared.values():
+            shm.close()
+            shm.unlink()
+        self._shared.clear()
+        if self._loader is not None:
+            self._loader.shutdown(wait=False, cancel_futures=True)
+
+    def song_time_now(self):
+        return self.current_song_time_ms
+
+    def _send(self, *message):
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                pass # Engine process is gone; the reader reports the exit
+
+    def _read_events(self):
+        while True:
+            try:
+                event, *args = self.conn.recv()
+            except (OSError, EOFError):
+                if self._running:
+                    self._finish_run()
+                return
+            if event == "progress":
+                self.current_song_time_ms = args[0]
+            elif event == "song_ready":
+                shm = self._shared.pop(args[0], None)
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+            elif event == "track_changed":
+                self._track_changed(args[0])
+            elif event == "finished":
+                self.current_song_time_ms = self.max_timestamp
+                self._emit(self.on_finished)
+            elif event == "status":
+                self._emit(self.on_status, args[0])
+            elif event == "exit":
+                self._finish_run()
+
+    def _track_changed(self, position):
+        """Mirrors the engine process's new playlist item here (a cache hit, off the timing process)."""
+        self.playlist_position = position
+        filepath, song_index, _ = self.playlist[position]
+        try:
+            song = self.load_file(filepath, song_index)
+        except Exception:
+            song = None
+        self.song = song
+        self.max_timestamp = song.max_timestamp if song else 0
+        self.current_song_time_ms = 0
+        self._emit(self.on_track_changed)
+
+    def _finish_run(self):
+        self._running = False
+        self._exited.set()
+        self._emit(self.on_exit)
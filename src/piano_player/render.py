@@ -0,0 +1,83 @@
+"""Offline audio preview: renders an actuation plan to a WAV file (needs NumPy)."""
+import wave
+
+from .midi import MIDI_LOWEST_PITCH, MIDI_OCTAVE_STEPS, _import_numpy
+
+# --- Audio preview ---
+DEFAULT_SAMPLE_RATE = 44100
+RENDER_CHUNK_S = 10.0 # Audio mixed and written per step; memory does not grow with song length
+MAJOR_SCALE = (0, 2, 4, 5, 7, 9, 11) # Semitones of the scale steps the keys are laid out on
+PARTIALS = ((1, 1.0, 1.2), (2, 0.5, 0.6), (3, 0.25, 0.4), (4, 0.12, 0.3)) # (harmonic, amplitude, decay s)
+ATTACK_S = 0.004
+RELEASE_S = 0.12 # Fade after a key is let go
+MAX_NOTE_S = 4.0 # Holds longer than this sound like this (the tone has died away by then)
+NOTE_GAIN = 0.25 # Peak of one note; the mix goes through a soft clip
+
+def key_frequency(key_index):
+    """Pitch (Hz) of a key: C4 upwards along the C major scale, like the in-game instrument."""
+    octave, step = divmod(key_index, MIDI_OCTAVE_STEPS)
+    pitch = MIDI_LOWEST_PITCH + 12 * octave + MAJOR_SCALE[step]
+    return 440.0 * 2 ** ((pitch - 69) / 12)
+
+def plan_notes(np, plan, speed, sample_rate):
+    """Start sample, held samples and key index of every press in the plan, in start order."""
+    counts = np.diff(np.frombuffer(plan.offsets, dtype=np.uint32).astype(np.int64))
+    op_times = np.repeat(np.frombuffer(plan.times, dtype=np.float64), counts)
+    op_keys = np.frombuffer(plan.keys, dtype=np.uint8)
+    op_downs = np.frombuffer(plan.downs, dtype=np.uint8)
+    # Sorted by key (stably, so in time order), each key's ops alternate press, release
+    order = np.argsort(op_keys, kind="stable")
+    presses = order[op_downs[order] == 1]
+    releases = order[np.flatnonzero(op_downs[order] == 1) + 1]
+    samples_per_ms = sample_rate / 1000 / speed
+    starts = np.round(op_times[presses] * samples_per_ms).astype(np.int64)
+    held = np.round((op_times[releases] - op_times[presses]) * samples_per_ms).astype(np.int64)
+    by_start = np.argsort(starts, kind="stable")
+    return starts[by_start], held[by_start], op_keys[presses][by_start]
+
+def note_tables(np, key_count, length, sample_rate):
+    """One decaying tone per key, length samples long (key_count x length, float32)."""
+    t = np.arange(length) / sample_rate
+    frequencies = np.array([key_frequency(k) for k in range(key_count)])[:, None]
+    tables = np.zeros((key_count, length))
+    for harmonic, amplitude, decay_s in PARTIALS:
+        tables += amplitude * np.sin(2 * np.pi * harmonic * frequencies * t) * np.exp(-t / decay_s)
+    attack = min(length, int(ATTACK_S * sample_rate))
+    tables[:, :attack] *= np.linspace(0, 1, attack, endpoint=False)
+    return (tables * (NOTE_GAIN / sum(amplitude for _, amplitude, _ in PARTIALS))).astype(np.float32)
+
+def render_plan(plan, speed, path, sample_rate=DEFAULT_SAMPLE_RATE, chunk_s=RENDER_CHUNK_S):
+    """
+    Renders an ActuationPlan, played at speed, as 16-bit mono WAV at path.
+    Every press sounds its key's tone until the release, then fades out
+    over RELEASE_S. Notes are mixed chunk by chunk with one array slice per
+    note, and each chunk is written before the next, so memory stays flat
+    however long the song is. Returns the length of the audio in seconds.
+    """
+    np = _import_numpy("Audio preview")
+    starts, held, keys = plan_notes(np, plan, speed, sample_rate)
+    tail = np.exp(-np.arange(int(RELEASE_S * sample_rate) * 5) / (RELEASE_S * sample_rate)).astype(np.float32)
+    held = np.minimum(held, int(MAX_NOTE_S * sample_rate))
+    note_length = int(held.max()) + len(tail) if len(held) else 0
+    tables = note_tables(np, max(len(plan.key_chars), 1), note_length, sample_rate)
+    total = int((starts + held).max()) + len(tail) if len(starts) else 0
+
+    chunk = max(1, int(chunk_s * sample_rate))
+    mix = np.zeros(chunk + note_length, dtype=np.float32) # The chunk, plus room for notes ringing past its end
+    with wave.open(path, "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(sample_rate)
+        first = 0
+        for chunk_start in range(0, total, chunk):
+            last = np.searchsorted(starts, chunk_start + chunk)
+            for start, hold, key_index in zip((starts[first:last] - chunk_start).tolist(), held[first:last].tolist(), keys[first:last].tolist()):
+                table = tables[key_index]
+                mix[start:start + hold] += table[:hold]
+                mix[start + hold:start + hold + len(tail)] += table[hold:hold + len(tail)] * tail
+            first = last
+            frames = min(chunk, total - chunk_start)
+            output.writeframes((np.tanh(mix[:frames]) * 32767).astype("<i2").tobytes())
+            mix[:note_length] = mix[chunk:chunk + note_length] # Carry the overhang into the next chunk
+            mix[note_length:] = 0
+    return total / sample_rate
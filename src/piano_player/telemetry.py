@@ -0,0 +1,108 @@
+"""Opt-in per-note timing telemetry."""
+import json
+from array import array
+from bisect import bisect_left
+
+# --- Timing telemetry ---
+class TimingRecorder:
+    """
+    Opt-in per-note timing trace kept in a preallocated ring buffer.
+    For every note it stores the scheduled time, when the scheduler dispatched
+    it, when the key actually went down and when it came back up (all clock ns).
+    Recording is a few array stores per note, so it is cheap enough to leave on;
+    once capacity notes have been recorded the oldest entries are overwritten.
+    """
+    UNSET = -1
+
+    def __init__(self, capacity=1 << 17):
+        self.capacity = capacity
+        self.count = 0 # Notes recorded so far (also the next note id)
+        self.note_ids = array("q", [self.UNSET]) * capacity
+        self.keys = array("I", [0]) * capacity # Code point of the key character
+        self.scheduled_ns = array("q", [0]) * capacity
+        self.dispatch_ns = array("q", [0]) * capacity
+        self.press_ns = array("q", [self.UNSET]) * capacity
+        self.release_ns = array("q", [self.UNSET]) * capacity
+
+    def reset(self):
+        self.count = 0
+        for column in (self.note_ids, self.press_ns, self.release_ns):
+            column[:] = array("q", [self.UNSET]) * self.capacity
+
+    def begin(self, scheduled_ns, dispatch_ns, key_char):
+        """Records a dispatched note and returns its id for mark_press/mark_release."""
+        note_id = self.count
+        slot = note_id % self.capacity
+        self.note_ids[slot] = note_id
+        self.keys[slot] = ord(key_char)
+        self.scheduled_ns[slot] = scheduled_ns
+        self.dispatch_ns[slot] = dispatch_ns
+        self.press_ns[slot] = self.UNSET
+        self.release_ns[slot] = self.UNSET
+        self.count = note_id + 1
+        return note_id
+
+    def mark_press(self, note_id, now_ns):
+        slot = note_id % self.capacity
+        if self.note_ids[slot] == note_id: # Not overwritten in the meantime
+            self.press_ns[slot] = now_ns
+
+    def mark_release(self, note_id, now_ns):
+        slot = note_id % self.capacity
+        if self.note_ids[slot] == note_id:
+            self.release_ns[slot] = now_ns
+
+    def _recent_slots(self, window):
+        count = min(self.count, self.capacity, window)
+        return [(self.count - 1 - i) % self.capacity for i in range(count)]
+
+    def lateness_ms(self, window=512):
+        """Press lateness (actual - scheduled, ms) of the last window pressed notes."""
+        return [(self.press_ns[slot] - self.scheduled_ns[slot]) / 1e6
+                for slot in self._recent_slots(window) if self.press_ns[slot] != self.UNSET]
+
+    def percentiles(self, window=512, fractions=(0.50, 0.95, 0.99)):
+        """Rolling lateness percentiles in ms, or None before any note was pressed."""
+        values = sorted(self.lateness_ms(window))
+        if not values:
+            return None
+        return [values[min(len(values) - 1, int(round(f * (len(values) - 1))))] for f in fractions]
+
+    def histogram(self, edges_ms=(0.5, 1, 2, 5, 10), window=512):
+        """Counts of recent lateness values per bucket; the last bucket is > edges_ms[-1]."""
+        counts = [0] * (len(edges_ms) + 1)
+        for value in self.lateness_ms(window):
+            counts[bisect_left(edges_ms, value)] += 1
+        return counts
+
+    def chord_spreads_ms(self, window=None):
+        """
+        Spread (last press - first press, ms) of each recent multi-note chord.
+        Notes dispatched together share a scheduled time and consecutive ids.
+        """
+        slots = self._recent_slots(window or self.capacity)[::-1]
+        spreads = []
+        group = []
+        for slot in slots + [None]:
+            if group and (slot is None or self.scheduled_ns[slot] != self.scheduled_ns[group[0]]):
+                presses = [self.press_ns[g] for g in group if self.press_ns[g] != self.UNSET]
+                if len(presses) > 1:
+                    spreads.append((max(presses) - min(presses)) / 1e6)
+                group = []
+            if slot is not None:
+                group.append(slot)
+        return spreads
+
+    def dump(self, file):
+        """Writes every retained note as CSV (times in ms from the first scheduled note)."""
+        first = self.count - min(self.count, self.capacity)
+        slots = [i % self.capacity for i in range(first, self.count)]
+        origin = self.scheduled_ns[slots[0]] if slots else 0
+        def ms(value):
+            return "" if value == self.UNSET else f"{(value - origin) / 1e6:.3f}"
+        file.write("note,key,scheduled_ms,dispatch_ms,press_ms,release_ms,lateness_ms\n")
+        for slot in slots:
+            press = self.press_ns[slot]
+            lateness = "" if press == self.UNSET else f"{(press - self.scheduled_ns[slot]) / 1e6:.3f}"
+            file.write(f"{self.note_ids[slot]},{json.dumps(chr(self.keys[slot]))},{ms(self.scheduled_ns[slot])},"
+                       f"{ms(self.dispatch_ns[slot])},{ms(press)},{ms(self.release_ns[slot])},{lateness}\n")
@@ -0,0 +1,89 @@
+"""Clocks used by the playback scheduler."""
+import time
+
+# --- Timing ---
+DEFAULT_SPIN_THRESHOLD_MS = 2.0 # Spin on the clock for the last stretch before a deadline
+MAX_SPIN_THRESHOLD_MS = 10.0    # Upper bound on spin time per wait, keeps CPU use predictable
+
+class PrecisionTimer:
+    """
+    Hybrid sleep/spin timer. Sleeps coarsely (interruptibly) until close to
+    the deadline, then spins on perf_counter_ns, yielding the GIL, for the
+    last stretch. Sleep overshoot and lateness are tracked as moving averages
+    and used to wake earlier / correct future deadlines.
+    """
+    SMOOTHING = 0.1 # Weight of the newest sample in the moving averages
+
+    now_ns = staticmethod(time.perf_counter_ns)
+
+    def __init__(self, spin_threshold_ms=DEFAULT_SPIN_THRESHOLD_MS):
+        self.spin_threshold_ns = int(min(max(spin_threshold_ms, 0.0), MAX_SPIN_THRESHOLD_MS) * 1_000_000)
+        self.sleep_overshoot_ns = 0.0 # Average amount a coarse sleep wakes up late
+        self.lateness_ns = 0.0        # Average lateness after the spin phase
+        self.waits = 0
+        self.total_lateness_ns = 0
+        self.total_spin_ns = 0
+
+    def wait_until_ns(self, deadline_ns, wake_event=None):
+        """
+        Waits until perf_counter_ns() reaches deadline_ns.
+        Returns False if wake_event was set before the deadline, True otherwise.
+        """
+        target_ns = deadline_ns - int(min(self.lateness_ns, self.spin_threshold_ns))
+        now = time.perf_counter_ns()
+
+        # Coarse phase: sleep until we are within the spin threshold (plus typical overshoot)
+        sleep_ns = target_ns - now - self.spin_threshold_ns - int(self.sleep_overshoot_ns)
+        if sleep_ns > 0:
+            if wake_event is not None:
+                if wake_event.wait(sleep_ns / 1e9):
+                    return False
+            else:
+                time.sleep(sleep_ns / 1e9)
+            woke = time.perf_counter_ns()
+            overshoot = woke - (now + sleep_ns)
+            self.sleep_overshoot_ns += self.SMOOTHING * (overshoot - self.sleep_overshoot_ns)
+            now = woke
+
+        # Fine phase: spin for at most spin_threshold_ns, yielding so other threads can run
+        spin_start = now
+        spin_end = spin_start + self.spin_threshold_ns
+        while now < target_ns and now < spin_end:
+            if wake_event is not None and wake_event.is_set():
+                self.total_spin_ns += now - spin_start
+                return False
+            time.sleep(0)
+            now = time.perf_counter_ns()
+        self.total_spin_ns += now - spin_start
+        if now < target_ns: # Spin budget used up early (should be rare); finish with a plain sleep
+            time.sleep((target_ns - now) / 1e9)
+            now = time.perf_counter_ns()
+
+        lateness = now - deadline_ns
+        self.lateness_ns += self.SMOOTHING * (lateness - self.lateness_ns)
+        if self.lateness_ns < 0:
+            self.lateness_ns = 0.0
+        self.waits += 1
+        self.total_lateness_ns += max(lateness, 0)
+        return True
+
+class VirtualClock:
+    """
+    Simulated clock for headless runs. Waits return immediately and advance
+    simulated time, so a song runs as fast as the CPU allows while producing
+    exactly the same event sequence as a real-time run.
+    """
+    def __init__(self, start_ns=0):
+        self.t = start_ns
+
+    def now_ns(self):
+        return self.t
+
+    def wait_until_ns(self, deadline_ns, wake_event=None):
+        if wake_event is not None and wake_event.is_set():
+            return False
+        self.advance_to(deadline_ns)
+        return True
+
+    def advance_to(self, deadline_ns):
+        self.t = max(self.t, deadline_ns)
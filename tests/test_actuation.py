@@ -0,0 +1,150 @@
+"""Invariants of compiled actuation plans and of playback across a playlist."""
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from piano_player.parsing import DEFAULT_KEY_MAPPING, compile_song # noqa: E402
+from piano_player.actuation import REPRESS_GAP_NS, compile_plan, govern_presses, song_presses # noqa: E402
+from piano_player.timing import VirtualClock # noqa: E402
+from piano_player.backends import RecordingBackend # noqa: E402
+from piano_player.engine import PlaybackEngine, build_playlist # noqa: E402
+
+def make_song(notes):
+    """CompiledSong from (time ms, key index) pairs."""
+    timestamp_dict = {}
+    for note_time, key_index in notes:
+        timestamp_dict.setdefault(note_time, []).append(f"1Key{key_index}")
+    return compile_song(timestamp_dict, DEFAULT_KEY_MAPPING)
+
+def random_song(seed, count=600):
+    """Chords, trills and fast repeats on few keys, so holds overlap the next press."""
+    rng = random.Random(seed)
+    notes, t = [], 0
+    for _ in range(count):
+        for key_index in rng.sample(range(15), rng.choice((1, 1, 2, 3))):
+            notes.append((t, rng.choice((key_index, rng.randrange(3)))))
+        t += rng.choice((0, 1, 4, 15, 40, 120, 300))
+    return make_song(notes)
+
+def replay(plan):
+    """Applies the plan from group 0, checking each op; returns the held bitmask before every group."""
+    held = 0
+    before = []
+    for group in range(len(plan)):
+        before.append(held)
+        for i in range(plan.offsets[group], plan.offsets[group + 1]):
+            bit = 1 << plan.keys[i]
+            if plan.downs[i]:
+                assert not held & bit, f"key {plan.keys[i]} pressed while down at {plan.times[group]} ms"
+                held |= bit
+            else:
+                assert held & bit, f"key {plan.keys[i]} released while up at {plan.times[group]} ms"
+                held &= ~bit
+    before.append(held)
+    return before
+
+PLAN_SETTINGS = (
+    # (hold_ms, gap_ms, key_gap_ms, press_interval_ms, tolerance_ms)
+    (250, 5, 0, 0, 0),
+    (40, 5, 0, 0, 0),
+    (1000, 10, 0, 0, 0),
+    (250, 5, 34, 0, 40),
+    (250, 5, 34, 25, 40),
+)
+
+def test_every_press_is_released_and_never_repeated_while_down():
+    for seed in range(5):
+        song = random_song(seed)
+        for settings in PLAN_SETTINGS:
+            plan = compile_plan(song, *settings)
+            presses = sum(plan.downs)
+            assert presses == len(plan.downs) - presses
+            assert replay(plan)[-1] == 0 # Nothing is left held at the end
+            assert list(plan.times) == sorted(plan.times)
+
+def test_every_note_is_pressed_without_limits():
+    song = random_song(7)
+    plan = compile_plan(song, 250, 5)
+    assert sum(plan.downs) == sum(len(set(song.keys[song.offsets[i]:song.offsets[i + 1]])) for i in range(len(song.times)))
+
+def test_held_at_matches_a_replay_from_the_start():
+    for seed in range(3):
+        for settings in PLAN_SETTINGS:
+            plan = compile_plan(random_song(seed), *settings)
+            expected = replay(plan)
+            assert [plan.held_at(index) for index in range(len(plan) + 1)] == expected
+
+def test_repressed_key_goes_up_before_its_next_press():
+    plan = compile_plan(make_song([(0, 3), (100, 3), (102, 3)]), 250, 5)
+    ops = [(plan.times[g], plan.downs[i]) for g in range(len(plan)) for i in range(plan.offsets[g], plan.offsets[g + 1])]
+    assert ops == [(0, 1), (95, 0), (100, 1), (101, 0), (102, 1), (352, 0)]
+
+def write_song(path, notes):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([{"name": os.path.basename(path), "songNotes": [{"time": t, "key": f"1Key{k}"} for t, k in notes]}], file)
+    return str(path)
+
+def test_key_ending_one_song_and_starting_the_next_stays_up(tmp_path):
+    first = write_song(tmp_path / "first.json", [(0, 1), (750, 0), (750, 4)])
+    second = write_song(tmp_path / "second.json", [(0, 0), (0, 4), (500, 2)])
+    clock = VirtualClock()
+    backend = RecordingBackend(clock)
+    engine = PlaybackEngine(backend, clock)
+    engine.playlist = build_playlist([first, second])
+    engine.run(1.0, 0.25)
+
+    events = {}
+    for event_ns, action, key_char in backend.events:
+        events.setdefault(key_char, []).append((event_ns, action))
+    for key_char in (DEFAULT_KEY_MAPPING[0], DEFAULT_KEY_MAPPING[4]):
+        (_, first_press), (released_ns, release), (pressed_ns, press), (_, last_release) = events[key_char]
+        assert (first_press, release, press, last_release) == ("press", "release", "press", "release")
+        assert pressed_ns - released_ns >= REPRESS_GAP_NS
+
+# --- Rate governor ---
+def test_governor_keeps_presses_of_one_key_apart():
+    song = make_song([(t, 0) for t in range(0, 400, 10)] + [(t, 1) for t in range(5, 400, 50)])
+    placed, _ = govern_presses(song, 34, 0, 1000)
+    for key_index in (0, 1):
+        onsets = [onset for onset, k in placed if k == key_index]
+        assert all(later - earlier >= 34 - 1e-9 for earlier, later in zip(onsets, onsets[1:]))
+
+def test_governor_caps_the_average_rate():
+    song = random_song(3)
+    capacity = max(song.offsets[i + 1] - song.offsets[i] for i in range(len(song.times)))
+    placed, _ = govern_presses(song, 0, 25, 10_000)
+    onsets = [onset for onset, _ in placed]
+    assert onsets == sorted(onsets)
+    for first in range(len(onsets)):
+        for last in range(first, min(len(onsets), first + 40)):
+            assert last - first + 1 <= capacity + (onsets[last] - onsets[first]) / 25 + 1e-6
+
+def test_governor_keeps_chords_together():
+    chords = [(t, k) for t in (0, 200, 400) for k in (2, 5, 9)]
+    placed, report = govern_presses(make_song(chords), 0, 50, 40)
+    assert sorted(placed) == sorted(chords) # The bucket holds a whole chord and refills in between
+    assert report == {"moved": 0, "max_shift_ms": 0.0, "dropped": []}
+
+def test_governor_drops_presses_beyond_the_tolerance():
+    placed, report = govern_presses(make_song([(0, 0), (5, 0), (30, 0), (100, 0)]), 34, 0, 10)
+    assert report["dropped"] == [(5, 0)]
+    assert placed == [(0, 0), (34, 0), (100, 0)] # 30 ms fits 4 ms late; 5 ms would be 29 ms late
+    assert report["moved"] == 1 and report["max_shift_ms"] == 4
+
+def test_governor_never_moves_a_press_earlier():
+    for seed in range(3):
+        song = random_song(seed)
+        written = list(song_presses(song))
+        for key_gap_ms, press_interval_ms in ((34, 0), (0, 30), (50, 20)):
+            placed, report = govern_presses(song, key_gap_ms, press_interval_ms, 60)
+            dropped = set(report["dropped"])
+            assert len(placed) + len(report["dropped"]) == len(written)
+            for key_index in range(15):
+                kept = [onset for onset, k in written if k == key_index and (onset, k) not in dropped]
+                moved_to = [onset for onset, k in placed if k == key_index]
+                assert len(kept) == len(moved_to)
+                assert all(new >= old for old, new in zip(kept, moved_to))
+                assert all(new - old <= 60 + 1e-9 for old, new in zip(kept, moved_to))
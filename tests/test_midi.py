@@ -0,0 +1,59 @@
+"""MIDI import: octave folding, the tempo map and percussion (needs NumPy)."""
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+pytest.importorskip("numpy")
+
+from piano_player.midi import midi_key_events # noqa: E402
+
+DIVISION = 96 # Ticks per quarter note
+
+def vlq(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    return bytes(reversed(out))
+
+def track(events):
+    """MTrk chunk from (tick, event bytes) pairs."""
+    data, last = b"", 0
+    for tick, event in sorted(events, key=lambda e: e[0]):
+        data += vlq(tick - last) + event
+        last = tick
+    data += b"\x00\xff\x2f\x00"
+    return b"MTrk" + struct.pack(">I", len(data)) + data
+
+def tempo(tick, us_per_quarter):
+    return tick, b"\xff\x51\x03" + us_per_quarter.to_bytes(3, "big")
+
+def note(tick, pitch, channel=0, length=24):
+    return [(tick, bytes([0x90 | channel, pitch, 64])), (tick + length, bytes([0x80 | channel, pitch, 0]))]
+
+@pytest.fixture
+def midi_file(tmp_path):
+    """Format 1: a tempo track (120 bpm, then 240 bpm from beat 3) and a note track with one drum hit."""
+    tempo_track = track([tempo(0, 500000), tempo(192, 250000)])
+    notes = note(0, 96) + note(96, 85) + note(192, 59) + note(288, 84) + note(0, 38, channel=9)
+    path = tmp_path / "fixture.mid"
+    path.write_bytes(b"MThd" + struct.pack(">IHHH", 6, 1, 2, DIVISION) + tempo_track + track(notes))
+    return str(path)
+
+def test_octave_fold_and_tempo_map(midi_file):
+    times_ms, key_indices, dropped = midi_key_events(midi_file, transpose=0)
+    # C7 -> C6 (key 14); C#6 -> C#5 -> C5 (key 7, sharps go down); B3 -> B4 (key 6); C6 stays (key 14)
+    assert key_indices.tolist() == [14, 7, 6, 14]
+    # Beats 1-2 at 500 ms each, then 250 ms per beat after the tempo change
+    assert times_ms.tolist() == [0, 500, 1000, 1250]
+    assert dropped == 0
+
+def test_percussion_is_left_out_unless_asked_for(midi_file):
+    times_ms, key_indices, _ = midi_key_events(midi_file, transpose=0, include_drums=True)
+    assert list(zip(times_ms.tolist(), key_indices.tolist()))[:2] == [(0, 1), (0, 14)] # D2 folds to D4 (key 1)
+    assert len(key_indices) == 5
@@ -0,0 +1,37 @@
+"""Regression tests for the streaming song-file reader."""
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+from piano_player.parsing import DEFAULT_KEY_MAPPING, _JsonStream, list_songs, load_song # noqa: E402
+
+def stream_decode(stream):
+    """Rebuilds a whole document through the stream's item/member walk, like the loaders do."""
+    char = stream.peek()
+    if char == "[":
+        return [stream_decode(stream) for _ in stream.items()]
+    if char == "{":
+        return {key: stream_decode(stream) for key in stream.members()}
+    return stream.value()
+
+def test_stream_matches_json_loads_at_every_chunk_boundary():
+    document = json.dumps([
+        {"name": "a", "bpm": 1.5e2, "songNotes": [{"time": i + 0.5, "key": f"1Key{i % 15}"} for i in range(40)]},
+        {"name": "b", "offset": -12.25E-1, "flags": [True, False, None], "songNotes": [{"time": 1e3, "key": "2Key3"}]},
+    ])
+    for chunk_size in range(1, 12):
+        assert stream_decode(_JsonStream(io.StringIO(document), chunk_size)) == json.loads(document)
+
+def test_fractional_times_split_across_chunks(tmp_path):
+    """Padding the first title moves the 64k chunk boundary across every character of a note."""
+    path = tmp_path / "export.json"
+    for padding in range(40):
+        title = "first" + "x" * padding
+        songs = [{"name": title, "songNotes": [{"time": i + 0.5, "key": f"1Key{i % 15}"} for i in range(3000)]},
+                 {"name": "second", "songNotes": [{"time": i + 0.5, "key": "1Key1"} for i in range(10)]}]
+        path.write_text(json.dumps(songs), encoding="utf-8")
+        assert list_songs(str(path)) == [title, "second"]
+        assert len(load_song(str(path), DEFAULT_KEY_MAPPING, 1)) == 10